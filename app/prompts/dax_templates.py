@@ -4,6 +4,8 @@ This module contains DAX-specific prompt templates and examples
 that can be used to generate better DAX formulas.
 """
 
+from types import MappingProxyType
+
 # Common DAX patterns with descriptions
 DAX_PATTERNS = {
     "year_to_date": {
@@ -194,4 +196,7 @@ DIVIDE(
 )
 """
     }
-}
\ No newline at end of file
+}
+
+# Flat lookup of every pattern by name, built once at import
+ALL_PATTERNS = MappingProxyType({**DAX_PATTERNS, **TIME_INTELLIGENCE_PATTERNS, **STATISTICAL_PATTERNS})
\ No newline at end of file
@@ -4,12 +4,11 @@ This module contains all prompt templates used in the application.
 Centralizing prompts makes them easier to maintain and update.
 """
 
-# Base system prompt template for Power BI assistant
-SYSTEM_PROMPT_BASE = """ 
+# Static system prompt instructions for the Power BI assistant. Kept free of any
+# per-session data so the block is byte-identical across requests and can be
+# served from Anthropic's prompt cache.
+SYSTEM_PROMPT_INSTRUCTIONS = """ 
     You are an expert Power BI consultant who specializes in helping users create DAX measures and visualizations.
-    Use the following information about the user's Power BI report structure:
-
-    {context}
 
     When asked to create measures:
     1. Provide the exact DAX formula using clear, consistent formatting that follows best practices:
@@ -39,6 +38,20 @@ SYSTEM_PROMPT_BASE = """
     Always provide practical, implementation-focused answers based on the specific tables and measures in the user's report.
 """
 
+# Per-session system prompt block wrapping the PBI metadata context
+SYSTEM_PROMPT_CONTEXT = """Use the following information about the user's Power BI report structure:
+
+{context}
+"""
+
+# Conversation summarization templates, used once the history exceeds its token budget
+HISTORY_SUMMARY_PROMPT = """Summarize the following conversation between a user and a Power BI assistant.
+Keep every table, column, and measure name that was mentioned, any DAX formulas that were agreed on, and the user's open requests. Be concise.
+
+{previous_summary}{transcript}"""
+HISTORY_SUMMARY_PREVIOUS = "Summary of the earlier conversation:\n{summary}\n\n"
+HISTORY_SUMMARY_MESSAGE = "Previous conversation summary: {summary}"
+
 # Context building templates
 CONTEXT_HEADER = "# POWER BI REPORT STRUCTURE\n\n"
 
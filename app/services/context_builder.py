@@ -1,5 +1,9 @@
 # app/services/context_builder.py
-from typing import Dict, Any, List
+import re
+import hashlib
+import orjson
+from collections import OrderedDict
+from typing import Dict, Any, List, Set, Tuple
 from app.prompts.templates import (
     CONTEXT_HEADER, 
     TABLES_SECTION, 
@@ -9,27 +13,104 @@ from app.prompts.templates import (
     VISUALIZATION_QUERY_GUIDANCE
 )
 
+# Query keywords mapped to the intent they signal, matched in a single pass
+_INTENT_KEYWORDS = {
+    "measure": "dax",
+    "dax": "dax",
+    "ytd": "dax",
+    "mtd": "dax",
+    "qtd": "dax",
+    "yoy": "dax",
+    "running total": "dax",
+    "moving average": "dax",
+    "visual": "viz",
+    "chart": "viz",
+    "graph": "viz",
+    "show": "viz",
+}
+_INTENT_RE = re.compile(
+    "|".join(re.escape(keyword) for keyword in sorted(_INTENT_KEYWORDS, key=len, reverse=True)),
+    re.IGNORECASE
+)
+
+# Generated contexts keyed by metadata hash; the context only changes when new
+# metadata is uploaded
+_CONTEXT_CACHE_SIZE = 8
+_context_cache = OrderedDict()
+
+def metadata_hash(metadata: Dict[str, Any]) -> str:
+    """Compute a content hash of the metadata.
+    
+    Args:
+        metadata: Extracted PBI metadata
+        
+    Returns:
+        Hex digest identifying this version of the metadata
+    """
+    serialized = orjson.dumps(metadata, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(serialized, digest_size=16).hexdigest()
+
 def generate_model_context(metadata: Dict[str, Any]) -> str:
     """Generate a context string for Claude based on the metadata.
     
+    Contexts are memoized by metadata hash, so regenerating the context for
+    unchanged metadata is a dictionary lookup.
+    
     Args:
         metadata: Extracted PBI metadata
         
     Returns:
         Formatted context string for Claude
     """
-    context = CONTEXT_HEADER
+    key = metadata_hash(metadata)
+    context = _context_cache.get(key)
     
-    # Add tables and columns
-    context += _format_tables_and_columns(metadata.get('tables', []))
+    if context is None:
+        context = _build_model_context(metadata)
+        _context_cache[key] = context
+        
+        # Keep only the most recently generated contexts
+        while len(_context_cache) > _CONTEXT_CACHE_SIZE:
+            _context_cache.popitem(last=False)
     
-    # Add relationships
-    context += _format_relationships(metadata.get('relationships', []))
+    return context
+
+def _build_model_context(metadata: Dict[str, Any]) -> str:
+    """Build the context string for Claude from the metadata.
     
-    # Add visualizations
-    context += _format_visualizations(metadata.get('visualizations', []))
+    Args:
+        metadata: Extracted PBI metadata
+        
+    Returns:
+        Formatted context string for Claude
+    """
+    return "".join([
+        CONTEXT_HEADER,
+        # Add tables and columns
+        _format_tables_and_columns(metadata.get('tables', [])),
+        # Add relationships
+        _format_relationships(metadata.get('relationships', [])),
+        # Add visualizations
+        _format_visualizations(metadata.get('visualizations', []))
+    ])
+
+def _flatten_table(table: Dict[str, Any]) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """Flatten a table's columns and measures into parallel lists.
     
-    return context
+    Args:
+        table: Table metadata
+        
+    Returns:
+        Tuple of column names, column data types, measure names, and measure expressions
+    """
+    columns = table.get('columns') or []
+    measures = table.get('measures') or []
+    return (
+        [column.get('name', '') for column in columns],
+        [column.get('dataType', '') for column in columns],
+        [measure.get('name', '') for measure in measures],
+        [measure.get('expression', '') for measure in measures]
+    )
 
 def _format_tables_and_columns(tables: List[Dict[str, Any]]) -> str:
     """Format tables and columns information.
@@ -40,30 +121,31 @@ def _format_tables_and_columns(tables: List[Dict[str, Any]]) -> str:
     Returns:
         Formatted string for tables and columns
     """
-    result = TABLES_SECTION
+    buf = [TABLES_SECTION]
+    append = buf.append
     
     for table in tables:
-        result += f"### Table: {table.get('name', '')}\n"
+        col_names, col_types, measure_names, measure_exprs = _flatten_table(table)
+        append(f"### Table: {table.get('name', '')}\n")
         
         # Add columns
-        if table.get('columns'):
-            result += "**Columns:**\n"
-            for column in table.get('columns', []):
-                result += f"- {column.get('name', '')} ({column.get('dataType', '')})\n"
+        if col_names:
+            append("**Columns:**\n")
+            for name, dtype in zip(col_names, col_types):
+                append(f"- {name} ({dtype})\n")
         
         # Add measures
-        if table.get('measures'):
-            result += "**Measures:**\n"
-            for measure in table.get('measures', []):
-                expression = measure.get('expression', '')
-                result += f"- {measure.get('name', '')}"
+        if measure_names:
+            append("**Measures:**\n")
+            for name, expression in zip(measure_names, measure_exprs):
                 if expression:
-                    result += f" = {expression}"
-                result += "\n"
+                    append(f"- {name} = {expression}\n")
+                else:
+                    append(f"- {name}\n")
         
-        result += "\n"
+        append("\n")
     
-    return result
+    return "".join(buf)
 
 def _format_relationships(relationships: List[Dict[str, Any]]) -> str:
     """Format relationships information.
@@ -77,13 +159,13 @@ def _format_relationships(relationships: List[Dict[str, Any]]) -> str:
     if not relationships:
         return ""
     
-    result = RELATIONSHIPS_SECTION
+    buf = [RELATIONSHIPS_SECTION]
     for rel in relationships:
-        result += f"- {rel.get('fromTable', '')}.{rel.get('fromColumn', '')} → "
-        result += f"{rel.get('toTable', '')}.{rel.get('toColumn', '')}\n"
+        get = rel.get
+        buf.append(f"- {get('fromTable', '')}.{get('fromColumn', '')} → {get('toTable', '')}.{get('toColumn', '')}\n")
     
-    result += "\n"
-    return result
+    buf.append("\n")
+    return "".join(buf)
 
 def _format_visualizations(visualizations: List[Dict[str, Any]]) -> str:
     """Format visualizations information.
@@ -97,36 +179,71 @@ def _format_visualizations(visualizations: List[Dict[str, Any]]) -> str:
     if not visualizations:
         return ""
     
-    result = VISUALIZATIONS_SECTION
+    buf = [VISUALIZATIONS_SECTION]
+    append = buf.append
     
     for idx, viz in enumerate(visualizations):
-        result += f"- Visualization {idx+1}: Type: {viz.get('type', 'Unknown')}\n"
+        append(f"- Visualization {idx+1}: Type: {viz.get('type', 'Unknown')}\n")
         
         # Add fields if available
-        if viz.get('fields'):
-            result += "  Fields used:\n"
-            for field in viz.get('fields', []):
-                result += f"  - {field.get('role', '')}: {field.get('field', '')}\n"
+        fields = viz.get('fields')
+        if fields:
+            append("  Fields used:\n")
+            for field in fields:
+                append(f"  - {field.get('role', '')}: {field.get('field', '')}\n")
     
-    return result
+    return "".join(buf)
 
-def enrich_context_with_query(context: str, query: str) -> str:
-    """Enrich the context with the current query for better results.
+def detect_query_intents(query: str) -> Set[str]:
+    """Detect the intents signalled by keywords in the query.
     
     Args:
-        context: Base context from the PBI metadata
         query: Current user query
         
     Returns:
-        Enhanced context with query-specific guidance
+        Set of intents: "dax" for measure questions, "viz" for visualization questions
+    """
+    return {_INTENT_KEYWORDS[match.group(0).lower()] for match in _INTENT_RE.finditer(query)}
+
+def is_measure_query(query: str) -> bool:
+    """Check whether the query is asking about a measure or DAX.
+    
+    Args:
+        query: Current user query
+        
+    Returns:
+        True if the query is measure/DAX related
+    """
+    return "dax" in detect_query_intents(query)
+
+def build_query_guidance(query: str) -> str:
+    """Build query-specific guidance to accompany the model context.
+    
+    Args:
+        query: Current user query
+        
+    Returns:
+        Guidance string for the query type, or an empty string
     """
     # Add specific guidance based on query type
-    lower_query = query.lower()
+    intents = detect_query_intents(query)
     
-    if "measure" in lower_query or "dax" in lower_query:
-        context += MEASURE_QUERY_GUIDANCE
+    if "dax" in intents:
+        return MEASURE_QUERY_GUIDANCE
     
-    elif "visual" in lower_query or "chart" in lower_query or "graph" in lower_query or "show" in lower_query:
-        context += VISUALIZATION_QUERY_GUIDANCE
+    elif "viz" in intents:
+        return VISUALIZATION_QUERY_GUIDANCE
     
-    return context
\ No newline at end of file
+    return ""
+
+def enrich_context_with_query(context: str, query: str) -> str:
+    """Enrich the context with the current query for better results.
+    
+    Args:
+        context: Base context from the PBI metadata
+        query: Current user query
+        
+    Returns:
+        Enhanced context with query-specific guidance
+    """
+    return context + build_query_guidance(query)
\ No newline at end of file
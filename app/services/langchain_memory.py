@@ -1,11 +1,14 @@
 # app/services/langchain_memory.py
-from langchain.memory import ConversationBufferMemory, StreamlitChatMessageHistory
-from langchain.schema import SystemMessage
 import streamlit as st
-from typing import List, Dict, Any, Optional
-import logging
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
 
-logging
+# LangChain message type to app role
+_TYPE_TO_ROLE = {
+    "system": "system",
+    "human": "user",
+    "ai": "assistant"
+}
 
 class LangchainChatMemory:
     """Manages chat history and context using Langchain's memory components."""
@@ -16,6 +19,9 @@ class LangchainChatMemory:
         Args:
             max_history: Maximum number of messages to keep in history
         """
+        # Import LangChain lazily so importing this module doesn't load it
+        from langchain.memory import ConversationBufferMemory, StreamlitChatMessageHistory
+        
         # Initialize Streamlit-based message history
         self.message_history = StreamlitChatMessageHistory(key="langchain_messages")
         
@@ -29,17 +35,72 @@ class LangchainChatMemory:
         
         self.max_history = max_history
         
+        # Session state key of the rolling buffer of messages in the app's format
+        self._converted_key = "langchain_messages_converted"
+        
         # Initialize session state for chat context if not exists
         if "chat_context" not in st.session_state:
             st.session_state.chat_context = {}
     
-    def add_message(self, role: str, content: str) -> None:
+    @staticmethod
+    def _convert_message(message) -> Optional[Dict[str, str]]:
+        """Convert a LangChain message to the app's message format.
+        
+        Args:
+            message: LangChain message
+            
+        Returns:
+            Message dictionary, or None for unsupported message types
+        """
+        role = _TYPE_TO_ROLE.get(getattr(message, "type", None))
+        if role is None:
+            return None
+        
+        return {
+            "role": role,
+            "content": message.content
+        }
+    
+    def _converted_messages(self) -> deque:
+        """Get this session's converted messages, aligned with the LangChain history.
+        
+        Both the LangChain history and the converted buffer are bounded deques,
+        so appending past max_history drops the oldest message without
+        reslicing. The buffer is maintained incrementally by add_message and
+        only rebuilt when it is out of sync with the underlying history (e.g.
+        after a clear).
+        
+        Returns:
+            Deque of converted messages, None where a message type is unsupported
+        """
+        messages = self.message_history.messages
+        if not isinstance(messages, deque) or messages.maxlen != self.max_history:
+            # Replace the backing list with a bounded deque, keeping the most recent messages
+            self.message_history.messages = deque(messages, maxlen=self.max_history)
+            messages = self.message_history.messages
+        
+        converted = st.session_state.get(self._converted_key)
+        
+        if converted is None or len(converted) != len(messages):
+            converted = deque(
+                (self._convert_message(message) for message in messages),
+                maxlen=self.max_history
+            )
+            st.session_state[self._converted_key] = converted
+        
+        return converted
+    
+    def add_message(self, role: str, content: str, rendered: Optional[Tuple] = None) -> None:
         """Add a message to the chat history.
         
         Args:
             role: The role of the sender (user or assistant)
             content: The message content
+            rendered: Precomputed display form of the content, kept with the
+                converted message so reruns don't have to format it again
         """
+        converted = self._converted_messages()
+        
         # Map role to LangChain's expected format
         if role == "user":
             self.message_history.add_user_message(content)
@@ -47,12 +108,16 @@ class LangchainChatMemory:
             self.message_history.add_ai_message(content)
         elif role == "system":
             # LangChain handles system messages differently
+            from langchain.schema import SystemMessage
             self.message_history.messages.append(SystemMessage(content=content))
+        else:
+            return
         
-        # Trim history if it exceeds max_history
-        if len(self.message_history.messages) > self.max_history:
-            # Keep only the most recent messages
-            self.message_history.messages = self.message_history.messages[-self.max_history:]
+        # The bounded deques drop the oldest message once max_history is reached
+        message = self._convert_message(self.message_history.messages[-1])
+        if rendered is not None:
+            message["rendered"] = rendered
+        converted.append(message)
     
     def get_messages(self) -> List[Dict[str, str]]:
         """Get all messages in the chat history in the format expected by the app.
@@ -60,24 +125,8 @@ class LangchainChatMemory:
         Returns:
             List of message dictionaries
         """
-        # Convert LangChain messages to the app's expected format
-        converted_messages = []
-        for message in self.message_history.messages:
-            if hasattr(message, "type") and message.type == "system":
-                role = "system"
-            elif hasattr(message, "type") and message.type == "human":
-                role = "user"
-            elif hasattr(message, "type") and message.type == "ai":
-                role = "assistant"
-            else:
-                continue
-            
-            converted_messages.append({
-                "role": role,
-                "content": message.content
-            })
-        
-        return converted_messages
+        # Copy the converted messages out of the rolling buffer
+        return [message for message in self._converted_messages() if message is not None]
     
     def get_last_n_messages(self, n: int) -> List[Dict[str, str]]:
         """Get the last n messages in the chat history.
@@ -94,6 +143,7 @@ class LangchainChatMemory:
     def clear_history(self) -> None:
         """Clear the chat history."""
         self.message_history.clear()
+        st.session_state[self._converted_key] = deque(maxlen=self.max_history)
     
     def set_context(self, key: str, value: Any) -> None:
         """Set a context value that persists across the conversation.
@@ -122,5 +172,5 @@ class LangchainChatMemory:
         Returns:
             List of message dictionaries in the format expected by Anthropic
         """
-        # This returns messages in the format expected by Anthropic API
-        return self.get_messages()
\ No newline at end of file
+        # This returns messages in the format expected by Anthropic API, without display-only fields
+        return [{"role": message["role"], "content": message["content"]} for message in self.get_messages()]
\ No newline at end of file
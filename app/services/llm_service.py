@@ -1,81 +1,421 @@
 # app/services/llm_service.py
-import requests
+import re
+import time
+import atexit
+import random
+import logging
+import threading
+import functools
+import httpx
+import orjson
 import config
-from app.services.context_builder import enrich_context_with_query
-from app.prompts.templates import SYSTEM_PROMPT_BASE
+from app.services.context_builder import build_query_guidance, is_measure_query
+from app.prompts.templates import (
+    SYSTEM_PROMPT_INSTRUCTIONS,
+    SYSTEM_PROMPT_CONTEXT,
+    HISTORY_SUMMARY_PROMPT,
+    HISTORY_SUMMARY_PREVIOUS,
+    HISTORY_SUMMARY_MESSAGE
+)
 from app.utils.dax_extractor import identify_dax_pattern_from_query, format_dax_patterns_for_context
+from app.utils.formatters import format_dax
 from app.services.langchain_memory import LangchainChatMemory
-from typing import List, Dict, Any
+from app.services.response_cache import ResponseCache, SemanticCache, hash_text
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+
+# Pooled HTTP/2 client reused across calls and Streamlit reruns, so each turn
+# skips the TCP + TLS handshake; the request headers never change, so they are
+# set once on the client. Compression is left to httpx, whose default
+# accept-encoding header lists every encoding it can decode (zstd through the
+# httpx[zstd] extra)
+_CLIENT_OPTIONS = {
+    "http2": True,
+    "headers": {
+        "x-api-key": config.ANTHROPIC_API_KEY,
+        "anthropic-version": "2023-06-01",
+        "anthropic-beta": "prompt-caching-2024-07-31",
+        "content-type": "application/json"
+    },
+    "timeout": httpx.Timeout(60.0, connect=5.0),
+    "limits": httpx.Limits(max_connections=16, max_keepalive_connections=4)
+}
+_CLIENT = httpx.Client(**_CLIENT_OPTIONS)
+atexit.register(_CLIENT.close)
+
+# Status codes worth retrying: rate limited, unavailable, overloaded
+_RETRY_STATUS_CODES = {429, 503, 529}
+
+# Bound concurrent API calls across sessions, and hold back new calls while
+# the API has told us we're rate limited
+_CALL_SEMAPHORE = threading.BoundedSemaphore(config.MAX_CONCURRENT_CLAUDE_CALLS)
+_rate_limited_until = 0.0
 
 # Initialize LangChain memory
 memory = LangchainChatMemory(max_history=config.MAX_HISTORY_MESSAGES)
 
-def query_claude(prompt: str, context: str, message_history: List[Dict[str, str]] = None) -> str:
-    """Query Claude API with the given prompt, context, and conversation history.
+# Initialize response caches shared by all sessions; the semantic cache is
+# only consulted for measure/DAX questions that miss the exact-match cache
+response_cache = ResponseCache(maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+semantic_cache = SemanticCache(maxsize=config.SEMANTIC_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+
+def invalidate_response_cache(context: str = None) -> None:
+    """Drop cached responses, e.g. when new PBI metadata is uploaded.
+    
+    Args:
+        context: Only drop responses generated for this context; drops everything if None
+    """
+    context_hash = hash_text(context) if context is not None else None
+    response_cache.invalidate(context_hash)
+    semantic_cache.invalidate(context_hash)
+
+# Static system prompt pieces, serialized once at import so every request sends
+# a byte-identical cached prefix without re-encoding it
+_INSTRUCTIONS_BLOCK = orjson.Fragment(orjson.dumps({
+    "type": "text",
+    "text": SYSTEM_PROMPT_INSTRUCTIONS,
+    "cache_control": {"type": "ephemeral"}
+}))
+_CONTEXT_PREFIX, _, _CONTEXT_SUFFIX = SYSTEM_PROMPT_CONTEXT.partition("{context}")
+
+# Keywords that trigger adding DAX templates, matched as substrings (so
+# "measures" and "calculated" count) in a single case-insensitive scan
+_DAX_TRIGGER = re.compile(r"measure|dax|calculate|formula", re.IGNORECASE)
+
+@functools.lru_cache(maxsize=8)
+def _context_block(context: str) -> orjson.Fragment:
+    """Serialize the cacheable PBI context block once per context.
+    
+    Args:
+        context: Context string with PBI metadata
+    
+    Returns:
+        Pre-serialized system content block
+    """
+    return orjson.Fragment(orjson.dumps({
+        "type": "text",
+        "text": _CONTEXT_PREFIX + context + _CONTEXT_SUFFIX,
+        "cache_control": {"type": "ephemeral"}
+    }))
+
+def _build_system_blocks(prompt: str, context: str) -> List[Any]:
+    """Build the system prompt as a list of content blocks.
+    
+    The static instructions and the per-session PBI context are marked as
+    cacheable prefixes; the query-specific guidance goes last, in its own
+    uncached block, so it never invalidates the cached prefix. The cacheable
+    blocks are pre-serialized, so only the guidance is encoded per request.
     
     Args:
         prompt: User's natural language query
         context: Context string with PBI metadata
-        message_history: List of previous messages in the conversation (deprecated, use LangChain memory)
-        
+    
     Returns:
-        Claude's response as a string
+        List of system content blocks for the Anthropic Messages API
     """
-    if not config.ANTHROPIC_API_KEY:
-        return "Error: Anthropic API key not found in environment variables."
+    blocks = [_INSTRUCTIONS_BLOCK, _context_block(context)]
     
-    # Enrich context with query-specific guidance
-    enhanced_context = enrich_context_with_query(context, prompt)
+    # Query-specific guidance
+    guidance = build_query_guidance(prompt)
     
     # Add DAX templates for measure-related queries
-    if any(keyword in prompt.lower() for keyword in ["measure", "dax", "calculate", "formula"]):
+    if _DAX_TRIGGER.search(prompt):
         # Identify relevant DAX patterns
         relevant_patterns = identify_dax_pattern_from_query(prompt)
         
-        # Format and add them to the context
-        dax_context = format_dax_patterns_for_context(relevant_patterns)
-        enhanced_context += dax_context
+        # Format and add them to the guidance
+        guidance += format_dax_patterns_for_context(relevant_patterns)
     
-    # Construct system prompt from template
-    system_prompt = SYSTEM_PROMPT_BASE.format(context=enhanced_context)
+    if guidance:
+        blocks.append({"type": "text", "text": guidance})
     
-    # Setup API request
-    headers = {
-        "x-api-key": config.ANTHROPIC_API_KEY,
-        "anthropic-version": "2023-06-01",
-        "content-type": "application/json"
-    }
+    return blocks
+
+def _retry_delay(attempt: int, response: httpx.Response = None) -> float:
+    """Get the time to wait before retrying a request.
+    
+    Args:
+        attempt: Zero-based number of the attempt that failed
+        response: Response of the failed attempt, if there was one
+        
+    Returns:
+        Seconds to wait, from the Retry-After header if present, otherwise
+        exponential backoff with jitter
+    """
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), config.CLAUDE_RETRY_MAX_WAIT)
+            except ValueError:
+                pass
+    
+    delay = config.CLAUDE_RETRY_INITIAL_WAIT * 2 ** attempt
+    return min(delay, config.CLAUDE_RETRY_MAX_WAIT) + random.uniform(0, config.CLAUDE_RETRY_INITIAL_WAIT)
+
+@contextmanager
+def _send_request(body: bytes, stream: bool = False) -> Iterator[httpx.Response]:
+    """Send a request to the Anthropic API, retrying timeouts and rate limits.
+    
+    Args:
+        body: Serialized request body
+        stream: Whether to stream the response body instead of reading it
+        
+    Yields:
+        The final response, closed when the block exits
+    """
+    global _rate_limited_until
+    
+    with _CALL_SEMAPHORE:
+        for attempt in range(config.CLAUDE_MAX_RETRIES + 1):
+            last_attempt = attempt == config.CLAUDE_MAX_RETRIES
+            
+            # Don't send a request we already know will be rejected
+            wait = _rate_limited_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            
+            try:
+                request = _CLIENT.build_request("POST", ANTHROPIC_API_URL, content=body)
+                response = _CLIENT.send(request, stream=stream)
+            except httpx.TimeoutException:
+                if last_attempt:
+                    raise
+                delay = _retry_delay(attempt)
+            else:
+                if response.status_code not in _RETRY_STATUS_CODES or last_attempt:
+                    logger.debug(f"Response content-encoding: {response.headers.get('content-encoding', 'identity')}")
+                    try:
+                        yield response
+                    finally:
+                        response.close()
+                    return
+                
+                delay = _retry_delay(attempt, response)
+                response.close()
+                if response.status_code == 429:
+                    _rate_limited_until = time.monotonic() + delay
+            
+            logger.warning(f"Claude API request failed, retrying in {delay:.1f}s "
+                           f"(attempt {attempt + 1} of {config.CLAUDE_MAX_RETRIES + 1})")
+            time.sleep(delay)
+
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the token count of messages at roughly four characters per token."""
+    return sum(len(message["content"]) for message in messages) // 4
+
+def _summarize_messages(messages: List[Dict[str, str]], previous_summary: str = None) -> str:
+    """Summarize conversation turns with the summary model.
+    
+    Args:
+        messages: Conversation turns to summarize
+        previous_summary: Summary of the turns before these, folded into the new one
+        
+    Returns:
+        Summary text
+    """
+    transcript = "\n\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    previous = HISTORY_SUMMARY_PREVIOUS.format(summary=previous_summary) if previous_summary else ""
+    body = orjson.dumps({
+        "model": config.MEMORY_SUMMARY_MODEL,
+        "max_tokens": config.MEMORY_SUMMARY_MAX_TOKENS,
+        "messages": [{
+            "role": "user",
+            "content": HISTORY_SUMMARY_PROMPT.format(previous_summary=previous, transcript=transcript)
+        }]
+    })
+    
+    with _send_request(body) as response:
+        response.raise_for_status()
+        return orjson.loads(response.content)["content"][0]["text"]
+
+def _summary_message(summary: str) -> Dict[str, str]:
+    """Build the user message that stands in for summarized turns."""
+    return {"role": "user", "content": HISTORY_SUMMARY_MESSAGE.format(summary=summary)}
+
+def _compact_history(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Replace older turns with a summary once the history exceeds its token budget.
+    
+    The summary is kept in the memory context along with the digests of the
+    turns it covers, so it is only regenerated once the turns sent verbatim
+    after it exceed the budget again. The chat history itself is unchanged.
+    
+    Args:
+        messages: Conversation history ending with the current prompt
+        
+    Returns:
+        Messages to send: the history as is, or a summary followed by the most recent turns
+    """
+    if _estimate_tokens(messages) <= config.MEMORY_TOKEN_BUDGET:
+        return messages
+    
+    digests = [hash_text(f"{message['role']}:{message['content']}") for message in messages]
+    cached = memory.get_context("history_summary")
+    
+    # Turns after the ones folded into the summary are sent verbatim. The covered
+    # turns are a prefix of the history (minus any that have since dropped off its
+    # front), so match them as a sequence rather than by content, which a repeated
+    # question would also match; the current prompt is never treated as covered
+    start = 0
+    if cached:
+        covered = cached["covered"]
+        start = next((count for count in range(min(len(covered), len(messages) - 1), 0, -1)
+                      if digests[:count] == covered[-count:]), 0)
+        if start == 0:
+            # The summary belongs to a conversation that has since been cleared
+            cached = None
+    
+    if cached and _estimate_tokens(messages[start:]) <= config.MEMORY_TOKEN_BUDGET:
+        return [_summary_message(cached["summary"])] + messages[start:]
     
+    # Fold all but the most recent turns into the summary; the recent turns must
+    # start with an assistant message so roles keep alternating after the summary
+    split = len(messages) - config.MEMORY_RECENT_MESSAGES
+    while split > start and messages[split]["role"] != "assistant":
+        split -= 1
+    
+    if split <= start:
+        if cached:
+            return [_summary_message(cached["summary"])] + messages[start:]
+        return messages
+    
+    try:
+        summary = _summarize_messages(messages[start:split], cached["summary"] if cached else None)
+    except Exception as e:
+        logger.warning(f"Error summarizing conversation history, sending it verbatim: {str(e)}")
+        return messages
+    
+    memory.set_context("history_summary", {"covered": digests[:split], "summary": summary})
+    return [_summary_message(summary)] + messages[split:]
+
+def _start_turn(prompt: str, context: str) -> Dict[str, Any]:
+    """Record the user prompt in memory and prepare the request for it.
+    
+    Args:
+        prompt: User's natural language query
+        context: Context string with PBI metadata
+        
+    Returns:
+        Turn state with the cache keys, the cached response if there is one,
+        and otherwise the request body to send
+    """
     # Get conversation history from LangChain memory
     messages = memory.format_history_for_anthropic()
     
+    # Look up the response cache, keyed on the turns preceding the prompt
+    history = messages[:-1] if messages and messages[-1]["content"] == prompt else messages
+    turn = {
+        "prompt": prompt,
+        "history": history,
+        "context_hash": hash_text(context),
+        "use_semantic_cache": is_measure_query(prompt)
+    }
+    turn["cache_key"] = response_cache.make_key(prompt, turn["context_hash"], config.CLAUDE_MODEL, history)
+    
     # If no messages or the last message isn't the current prompt, add it
     if not messages or messages[-1]["content"] != prompt:
         memory.add_message("user", prompt)
         messages = memory.format_history_for_anthropic()
     
-    # Call Claude API
-    try:
-        data = {
+    cached_response = response_cache.get(turn["cache_key"])
+    if cached_response is None and turn["use_semantic_cache"]:
+        cached_response = semantic_cache.get(prompt, turn["context_hash"], config.CLAUDE_MODEL, history)
+    turn["cached_response"] = cached_response
+    
+    if cached_response is None:
+        # Construct system prompt blocks (cached instructions + context, uncached guidance)
+        turn["data"] = {
             "model": config.CLAUDE_MODEL,
-            "system": system_prompt,
-            "messages": messages,
+            "system": _build_system_blocks(prompt, context),
+            "messages": _compact_history(messages),
             "max_tokens": config.MAX_TOKENS
         }
+    else:
+        logger.info("Response cache hit")
+    
+    return turn
+
+def _finish_turn(turn: Dict[str, Any], assistant_response: str) -> None:
+    """Cache the assistant response and add it to memory.
+    
+    Args:
+        turn: Turn state from _start_turn
+        assistant_response: Complete assistant response
+    """
+    if turn["cached_response"] is None:
+        response_cache.set(turn["cache_key"], turn["context_hash"], assistant_response)
+        if turn["use_semantic_cache"]:
+            semantic_cache.set(turn["prompt"], turn["context_hash"], config.CLAUDE_MODEL,
+                               turn["history"], assistant_response)
+    
+    # Add assistant response to memory, with its code blocks split out once for display
+    memory.add_message("assistant", assistant_response, rendered=format_dax(assistant_response))
+
+def _log_usage(usage: Dict[str, Any]) -> None:
+    """Log prompt cache usage reported by the API."""
+    logger.info(f"Prompt cache: read {usage.get('cache_read_input_tokens', 0)} tokens, "
+                f"wrote {usage.get('cache_creation_input_tokens', 0)} tokens")
+
+def stream_claude(prompt: str, context: str) -> Iterator[str]:
+    """Query Claude API and yield the response text as it is generated.
+    
+    The assembled response is cached and added to memory only once the
+    stream completes with a message_stop event.
+    
+    Args:
+        prompt: User's natural language query
+        context: Context string with PBI metadata
+        
+    Yields:
+        Chunks of Claude's response text
+    """
+    if not config.ANTHROPIC_API_KEY:
+        yield "Error: Anthropic API key not found in environment variables."
+        return
+    
+    turn = _start_turn(prompt, context)
+    if turn["cached_response"] is not None:
+        _finish_turn(turn, turn["cached_response"])
+        yield turn["cached_response"]
+        return
+    
+    chunks = []
+    try:
+        body = orjson.dumps(dict(turn["data"], stream=True))
         
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers=headers,
-            json=data
-        )
+        with _send_request(body, stream=True) as response:
+            if response.status_code != 200:
+                response.read()
+                yield f"Error: {response.status_code} - {response.text}"
+                return
+            
+            # Parse server-sent events and yield text deltas as they arrive
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                
+                event = orjson.loads(line[5:])
+                event_type = event.get("type")
+                
+                if event_type == "content_block_delta" and event["delta"].get("type") == "text_delta":
+                    chunks.append(event["delta"]["text"])
+                    yield event["delta"]["text"]
+                elif event_type == "message_start":
+                    _log_usage(event["message"].get("usage", {}))
+                elif event_type == "message_stop":
+                    _finish_turn(turn, "".join(chunks))
+                    return
+                elif event_type == "error":
+                    yield f"Error: {event['error'].get('message', 'Unknown streaming error')}"
+                    return
         
-        if response.status_code == 200:
-            assistant_response = response.json()["content"][0]["text"]
-            # Add assistant response to memory
-            memory.add_message("assistant", assistant_response)
-            return assistant_response
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+        yield "Error: Claude API stream ended unexpectedly."
     
     except Exception as e:
-        return f"Error calling Claude API: {str(e)}"
\ No newline at end of file
+        yield f"Error calling Claude API: {str(e)}"
\ No newline at end of file
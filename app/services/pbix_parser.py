@@ -1,15 +1,23 @@
 # app/services/pbix_parser.py
-import os
-import json
-import tempfile
 import zipfile
 import logging
-from typing import Dict, Any, List
+import functools
+import ijson
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Iterator, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of distinct visual config strings kept parsed
+_CONFIG_CACHE_SIZE = 256
+
+# DataModelSchema items extracted by _schema_items
+_TABLE_PREFIX = 'model.tables.item'
+_RELATIONSHIP_PREFIX = 'model.relationships.item'
+
 def extract_pbix_metadata(uploaded_file) -> Dict[str, Any]:
     """Extract metadata from a PBIX file.
     
@@ -26,121 +34,73 @@ def extract_pbix_metadata(uploaded_file) -> Dict[str, Any]:
         "visualizations": []
     }
     
-    # Create a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pbix') as tmp_file:
-        # Write the uploaded file to the temporary file
-        tmp_file.write(uploaded_file.getvalue())
-        tmp_path = tmp_file.name
-    
     try:
-        # Open PBIX as a zip file
-        with zipfile.ZipFile(tmp_path, 'r') as zip_ref:
-            # List all files in the archive
-            file_list = zip_ref.namelist()
+        # Open PBIX as a zip file straight from the in-memory upload
+        with zipfile.ZipFile(uploaded_file, 'r') as zip_ref:
+            # Sort archive entries into schema and layout files in a single pass
+            file_list = zip_ref.infolist()
             logger.info(f"Found {len(file_list)} files in PBIX")
             
+            schema_files = []
+            layout_files = []
+            for file_info in file_list:
+                name = file_info.filename
+                if 'DataModelSchema' in name:
+                    schema_files.append(file_info)
+                if 'Layout' in name and name.endswith('.json'):
+                    layout_files.append(file_info)
+            
             # Extract data model schema
-            schema_files = [f for f in file_list if 'DataModelSchema' in f]
             if schema_files:
-                logger.info(f"Found schema file: {schema_files[0]}")
-                with zip_ref.open(schema_files[0]) as schema_file:
-                    try:
-                        schema_data = json.loads(schema_file.read().decode('utf-8'))
-                        
-                        # Extract tables
-                        if 'model' in schema_data and 'tables' in schema_data['model']:
-                            tables = schema_data['model']['tables']
-                            logger.info(f"Found {len(tables)} tables in schema")
-                            
-                            for table in tables:
-                                table_info = {
-                                    'name': table.get('name', ''),
-                                    'columns': [],
-                                    'measures': []
-                                }
-                                
-                                # Extract columns
-                                if 'columns' in table:
-                                    for column in table['columns']:
-                                        table_info['columns'].append({
+                logger.info(f"Found schema file: {schema_files[0].filename}")
+                try:
+                    # Stream tables and relationships out of the schema in a single pass
+                    # instead of loading the whole document
+                    with zip_ref.open(schema_files[0]) as schema_file:
+                        for prefix, item in _schema_items(schema_file):
+                            if prefix == _TABLE_PREFIX:
+                                metadata['tables'].append({
+                                    'name': item.get('name', ''),
+                                    'columns': [
+                                        {
                                             'name': column.get('name', ''),
                                             'dataType': column.get('dataType', '')
-                                        })
-                                
-                                # Extract measures
-                                if 'measures' in table:
-                                    for measure in table['measures']:
-                                        table_info['measures'].append({
+                                        }
+                                        for column in item.get('columns', [])
+                                    ],
+                                    'measures': [
+                                        {
                                             'name': measure.get('name', ''),
                                             'expression': measure.get('expression', '')
-                                        })
-                                
-                                metadata['tables'].append(table_info)
-                        
-                        # Extract relationships
-                        if 'model' in schema_data and 'relationships' in schema_data['model']:
-                            relationships = schema_data['model']['relationships']
-                            logger.info(f"Found {len(relationships)} relationships in schema")
-                            
-                            for rel in relationships:
-                                relationship = {
-                                    'fromTable': rel.get('fromTable', ''),
-                                    'fromColumn': rel.get('fromColumn', ''),
-                                    'toTable': rel.get('toTable', ''),
-                                    'toColumn': rel.get('toColumn', '')
-                                }
-                                metadata['relationships'].append(relationship)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Error parsing schema JSON: {str(e)}")
-                        raise
+                                        }
+                                        for measure in item.get('measures', [])
+                                    ]
+                                })
+                            else:
+                                metadata['relationships'].append({
+                                    'fromTable': item.get('fromTable', ''),
+                                    'fromColumn': item.get('fromColumn', ''),
+                                    'toTable': item.get('toTable', ''),
+                                    'toColumn': item.get('toColumn', '')
+                                })
+                    logger.info(f"Found {len(metadata['tables'])} tables in schema")
+                    logger.info(f"Found {len(metadata['relationships'])} relationships in schema")
+                except ijson.JSONError as e:
+                    logger.error(f"Error parsing schema JSON: {str(e)}")
+                    raise
             else:
                 logger.warning("No DataModelSchema found in PBIX file!")
             
             # Look for layout files to extract visualization info
-            layout_files = [f for f in file_list if 'Layout' in f and f.endswith('.json')]
             if layout_files:
                 logger.info(f"Found {len(layout_files)} layout files")
                 
-                for layout_file in layout_files:
-                    try:
-                        with zip_ref.open(layout_file) as lf:
-                            layout_data = json.loads(lf.read().decode('utf-8'))
-                            
-                            if 'sections' in layout_data:
-                                for section in layout_data['sections']:
-                                    if 'visualContainers' in section:
-                                        viz_containers = section['visualContainers']
-                                        
-                                        for viz_container in viz_containers:
-                                            if 'config' in viz_container:
-                                                config = viz_container['config']
-                                                if isinstance(config, str):
-                                                    try:
-                                                        config = json.loads(config)
-                                                    except json.JSONDecodeError:
-                                                        continue
-                                                
-                                                if 'singleVisual' in config:
-                                                    viz_type = config['singleVisual'].get('visualType', 'unknown')
-                                                    
-                                                    viz_info = {
-                                                        'type': viz_type,
-                                                        'fields': []
-                                                    }
-                                                    
-                                                    # Extract fields if available
-                                                    if 'projections' in config['singleVisual']:
-                                                        for role, projections in config['singleVisual']['projections'].items():
-                                                            for projection in projections:
-                                                                if 'queryRef' in projection:
-                                                                    viz_info['fields'].append({
-                                                                        'role': role,
-                                                                        'field': projection['queryRef']
-                                                                    })
-                                                    
-                                                    metadata['visualizations'].append(viz_info)
-                    except Exception as e:
-                        logger.error(f"Error processing layout file {layout_file}: {str(e)}")
+                # Read and parse layout files concurrently; ZipFile serializes the
+                # underlying reads, but decompression and parsing overlap
+                with ThreadPoolExecutor(max_workers=min(8, len(layout_files))) as executor:
+                    results = executor.map(lambda layout_file: _parse_layout_file(zip_ref, layout_file), layout_files)
+                    for visualizations in results:
+                        metadata['visualizations'].extend(visualizations)
             else:
                 logger.warning("No layout files found in PBIX file!")
         
@@ -154,8 +114,89 @@ def extract_pbix_metadata(uploaded_file) -> Dict[str, Any]:
         logger.error(f"Error extracting PBIX metadata: {str(e)}")
         raise
     
-    finally:
-        # Clean up temporary file
-        os.unlink(tmp_path)
+    return metadata
+
+def _schema_items(schema_file) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Stream the tables and relationships of a DataModelSchema in one parse.
     
-    return metadata
\ No newline at end of file
+    Args:
+        schema_file: Open DataModelSchema archive entry
+        
+    Yields:
+        Item prefix (_TABLE_PREFIX or _RELATIONSHIP_PREFIX) and the parsed item
+    """
+    builder = None
+    item_prefix = None
+    
+    for prefix, event, value in ijson.parse(schema_file):
+        if builder is None:
+            if event == 'start_map' and (prefix == _TABLE_PREFIX or prefix == _RELATIONSHIP_PREFIX):
+                builder = ijson.ObjectBuilder()
+                item_prefix = prefix
+                builder.event(event, value)
+            continue
+        
+        builder.event(event, value)
+        if event == 'end_map' and prefix == item_prefix:
+            yield item_prefix, builder.value
+            builder = None
+
+def _parse_layout_file(zip_ref: zipfile.ZipFile, layout_file: zipfile.ZipInfo) -> List[Dict[str, Any]]:
+    """Extract visualization info from a layout file.
+    
+    Args:
+        zip_ref: Open PBIX archive
+        layout_file: Archive entry of the layout file
+        
+    Returns:
+        List of visualizations extracted before any processing error
+    """
+    visualizations = []
+    
+    try:
+        layout_data = orjson.loads(zip_ref.read(layout_file))
+        
+        for section in layout_data.get('sections', ()):
+            for viz_container in section.get('visualContainers', ()):
+                config = viz_container.get('config')
+                if isinstance(config, str):
+                    try:
+                        config = _parse_config(config)
+                    except orjson.JSONDecodeError:
+                        continue
+                
+                single_visual = config.get('singleVisual') if isinstance(config, dict) else None
+                if single_visual is None:
+                    continue
+                
+                # Extract fields if available
+                projections = single_visual.get('projections') or {}
+                visualizations.append({
+                    'type': single_visual.get('visualType', 'unknown'),
+                    'fields': [
+                        {'role': role, 'field': projection['queryRef']}
+                        for role, role_projections in projections.items()
+                        for projection in role_projections
+                        if 'queryRef' in projection
+                    ]
+                })
+    except Exception as e:
+        logger.error(f"Error processing layout file {layout_file.filename}: {str(e)}")
+    
+    return visualizations
+
+@functools.lru_cache(maxsize=_CONFIG_CACHE_SIZE)
+def _parse_config(config: str) -> Any:
+    """Parse a visual container's JSON-encoded config.
+    
+    Layouts repeat the same serialized configs across visuals and pages, so
+    identical strings are parsed once. The result is shared and must be
+    treated as read-only.
+    
+    Args:
+        config: JSON-encoded config string
+        
+    Returns:
+        Parsed config
+    """
+    return orjson.loads(config)
\ No newline at end of file
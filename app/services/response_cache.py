@@ -0,0 +1,274 @@
+# app/services/response_cache.py
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+# Punctuation dropped from prompts; comparison and arithmetic operators are kept,
+# since "amount > 1000" and "amount < 1000" ask for different measures
+_PUNCTUATION_RE = re.compile(r"[^\w\s%<>=!+\-*/()]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Phrases folded into a single term so common DAX paraphrases share a key
+_PHRASE_SYNONYMS = {
+    "year to date": "ytd",
+    "month to date": "mtd",
+    "quarter to date": "qtd",
+    "year over year": "yoy",
+    "running total": "running_total",
+    "running sum": "running_total",
+    "cumulative": "running_total",
+    "moving average": "moving_average",
+    "rolling average": "moving_average",
+    "percentage": "percent",
+    "%": "percent",
+}
+_PHRASE_RE = re.compile("|".join(re.escape(phrase) for phrase in sorted(_PHRASE_SYNONYMS, key=len, reverse=True)))
+
+# Filler words that carry no meaning for matching DAX questions; single letters
+# and "measure" are kept, since "product A" and "YTD measure" name entities
+_STOP_WORDS = frozenset([
+    "an", "the", "of", "for", "to", "me", "my", "please", "can", "could", "you",
+    "how", "do", "what", "is", "create", "write", "make", "give", "build", "new",
+    "dax", "formula", "calculate", "calculation",
+])
+
+# Words and operators whose operands can't be swapped; prompts using them must
+# also list their terms in the same order ("divide profit by sales" is not
+# "divide sales by profit")
+_ORDERED_WORDS = frozenset([
+    "divide", "divided", "ratio", "over", "minus", "subtract", "from", "than", "vs", "versus",
+    "<", ">", "<=", ">=", "/", "-",
+])
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different phrasings share a cache key.
+    
+    Args:
+        prompt: User's natural language query
+    
+    Returns:
+        Lowercased prompt with punctuation other than operators stripped and
+        whitespace collapsed
+    """
+    prompt = _PUNCTUATION_RE.sub(" ", prompt.lower())
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+def hash_text(text: str) -> str:
+    """Compute a stable digest of a text value.
+    
+    Args:
+        text: Text to hash
+    
+    Returns:
+        Hex digest of the text
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _scope_key(context_hash: str, model: str, history: Optional[List[Dict[str, str]]]) -> str:
+    """Build the digest of everything a response depends on besides the prompt."""
+    parts = [context_hash, model]
+    for message in history or []:
+        parts.append(f"{message['role']}:{message['content']}")
+    return hash_text("|".join(parts))
+
+def _prompt_terms(prompt: str) -> List[str]:
+    """Get a prompt's meaningful terms in order, with common phrases folded."""
+    text = _PHRASE_RE.sub(lambda m: f" {_PHRASE_SYNONYMS[m.group(0)]} ", normalize_prompt(prompt))
+    return [term for term in text.split() if term not in _STOP_WORDS]
+
+def _is_ordered(terms: List[str]) -> bool:
+    """Check whether a prompt's meaning depends on the order of its terms."""
+    return any(term in _ORDERED_WORDS for term in terms)
+
+class ResponseCache:
+    """In-process LRU cache of Claude responses with a time-to-live."""
+    
+    def __init__(self, maxsize: int = 1024, ttl: int = 3600):
+        """Initialize the response cache.
+        
+        Args:
+            maxsize: Maximum number of responses to keep (0 disables caching)
+            ttl: Time in seconds before a cached response expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def make_key(self, prompt: str, context_hash: str, model: str,
+                 history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Build the cache key for a query.
+        
+        Args:
+            prompt: User's natural language query
+            context_hash: Digest of the PBI metadata context
+            model: Claude model name
+            history: Conversation turns preceding the prompt
+        
+        Returns:
+            Cache key string
+        """
+        return hash_text(f"{normalize_prompt(prompt)}|{_scope_key(context_hash, model, history)}")
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response.
+        
+        Args:
+            key: Cache key from make_key
+        
+        Returns:
+            Cached response or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            expires, _, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, context_hash: str, value: str) -> None:
+        """Store a response in the cache.
+        
+        Args:
+            key: Cache key from make_key
+            context_hash: Digest of the PBI metadata context the response was generated for
+            value: Response to cache
+        """
+        if self.maxsize <= 0:
+            return
+        
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, context_hash, value)
+            self._entries.move_to_end(key)
+            
+            # Evict least recently used entries
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, context_hash: Optional[str] = None) -> None:
+        """Drop cached responses.
+        
+        Args:
+            context_hash: Only drop responses generated for this context; drops everything if None
+        """
+        with self._lock:
+            if context_hash is None:
+                self._entries.clear()
+                return
+            
+            stale_keys = [key for key, (_, entry_hash, _) in self._entries.items() if entry_hash == context_hash]
+            for key in stale_keys:
+                del self._entries[key]
+
+class SemanticCache:
+    """In-process cache that serves responses for paraphrased prompts.
+    
+    Prompts match if they use the same set of terms, after folding common DAX
+    phrases ("year to date", "running total", ...) into single terms and
+    dropping filler words, so "ytd sales" matches "sales year to date" but not
+    "median sales" or "sales for product A". Prompts with an operator whose
+    operands can't be swapped must also list their terms in the same order.
+    Lookups only consider responses generated for the same context, model,
+    and preceding turns.
+    """
+    
+    def __init__(self, maxsize: int = 256, ttl: int = 3600):
+        """Initialize the semantic cache.
+        
+        Args:
+            maxsize: Maximum number of responses to keep (0 disables caching)
+            ttl: Time in seconds before a cached response expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _make_key(self, terms: List[str], context_hash: str, model: str,
+                  history: Optional[List[Dict[str, str]]]) -> str:
+        """Build the cache key shared by all prompts with the same terms."""
+        return hash_text(f"{' '.join(sorted(set(terms)))}|{_scope_key(context_hash, model, history)}")
+    
+    def get(self, prompt: str, context_hash: str, model: str,
+            history: Optional[List[Dict[str, str]]] = None) -> Optional[str]:
+        """Get the cached response for a paraphrase of the prompt.
+        
+        Args:
+            prompt: User's natural language query
+            context_hash: Digest of the PBI metadata context
+            model: Claude model name
+            history: Conversation turns preceding the prompt
+            
+        Returns:
+            Cached response or None if no paraphrase is cached
+        """
+        terms = _prompt_terms(prompt)
+        if not terms:
+            return None
+        
+        key = self._make_key(terms, context_hash, model, history)
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            expires, _, entry_terms, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            
+            if _is_ordered(terms) and terms != entry_terms:
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, prompt: str, context_hash: str, model: str,
+            history: Optional[List[Dict[str, str]]], value: str) -> None:
+        """Store a response in the cache.
+        
+        Args:
+            prompt: User's natural language query
+            context_hash: Digest of the PBI metadata context
+            model: Claude model name
+            history: Conversation turns preceding the prompt
+            value: Response to cache
+        """
+        terms = _prompt_terms(prompt)
+        if self.maxsize <= 0 or not terms:
+            return
+        
+        key = self._make_key(terms, context_hash, model, history)
+        
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, context_hash, terms, value)
+            self._entries.move_to_end(key)
+            
+            # Evict least recently used entries
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, context_hash: Optional[str] = None) -> None:
+        """Drop cached responses.
+        
+        Args:
+            context_hash: Only drop responses generated for this context; drops everything if None
+        """
+        with self._lock:
+            if context_hash is None:
+                self._entries.clear()
+                return
+            
+            stale_keys = [key for key, (_, entry_hash, _, _) in self._entries.items() if entry_hash == context_hash]
+            for key in stale_keys:
+                del self._entries[key]
\ No newline at end of file
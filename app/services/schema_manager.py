@@ -1,14 +1,19 @@
 # app/services/schema_manager.py
 
 import os
-import json
+import orjson
 import logging
-from typing import Dict, List, Any, Optional, Union
+import functools
+from collections import OrderedDict, Counter
+from typing import Dict, List, Any, Optional
 import tempfile
 from datetime import datetime
 
+import config
+
 from app.services.pbix_parser import extract_pbix_metadata
 from app.services.tmdl_parser import TMDLParser
+from app.services.context_builder import metadata_hash
 from app.prompts.templates import (
     SCHEMA_CONTEXT_HEADER,
     SCHEMA_TABLES_SECTION,
@@ -20,6 +25,9 @@ from app.prompts.templates import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of prepared contexts kept per schema manager
+_CONTEXT_CACHE_SIZE = 8
+
 class SchemaManager:
     """Unified manager for Power BI schema data from different sources."""
     
@@ -31,6 +39,9 @@ class SchemaManager:
         """
         self.data_dir = data_dir
         
+        # Prepared contexts keyed by schema hash
+        self._context_cache = OrderedDict()
+        
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
     
@@ -125,8 +136,8 @@ class SchemaManager:
         """
         file_path = os.path.join(self.data_dir, f"{schema_id}.json")
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(schema, f, indent=2)
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(schema, option=orjson.OPT_INDENT_2))
         
         logger.info(f"Schema saved to {file_path}")
     
@@ -146,8 +157,8 @@ class SchemaManager:
             return None
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(file_path, 'rb') as f:
+                return orjson.loads(f.read())
         except Exception as e:
             logger.error(f"Error loading schema: {str(e)}")
             return None
@@ -158,77 +169,139 @@ class SchemaManager:
         Returns:
             List of dictionaries with schema info
         """
-        schemas = []
+        found = []
         
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.json'):
-                schema_id = filename[:-5]  # Remove .json extension
-                schemas.append({
-                    "id": schema_id,
-                    "created": self._parse_timestamp_from_id(schema_id),
-                    "type": "pbix" if schema_id.startswith("pbix_") else "tmdl"
-                })
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    schema_id = entry.name[:-5]  # Remove .json extension
+                    found.append((self._parse_timestamp_from_id(schema_id), schema_id))
         
-        # Sort by creation time, newest first
-        schemas.sort(key=lambda x: x["created"], reverse=True)
+        # Sort by creation time, newest first, with unparseable IDs ahead of dated ones
+        found.sort(key=lambda x: (x[0] is None, x[0] or datetime.min), reverse=True)
         
-        return schemas
+        return [
+            {
+                "id": schema_id,
+                "created": timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else "Unknown",
+                "type": "pbix" if schema_id.startswith("pbix_") else "tmdl"
+            }
+            for timestamp, schema_id in found
+        ]
     
-    def _parse_timestamp_from_id(self, schema_id: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _parse_timestamp_from_id(schema_id: str) -> Optional[datetime]:
         """Parse timestamp from schema ID.
         
         Args:
             schema_id: Schema identifier
             
         Returns:
-            Formatted timestamp string
+            Creation time, or None if the ID has no valid timestamp
         """
         # Extract timestamp part
         parts = schema_id.split('_', 1)
         if len(parts) == 2 and len(parts[1]) == 14:  # YYYYMMDDhhmmss format
             try:
-                timestamp = datetime.strptime(parts[1], '%Y%m%d%H%M%S')
-                return timestamp.strftime('%Y-%m-%d %H:%M:%S')
+                return datetime.strptime(parts[1], '%Y%m%d%H%M%S')
             except ValueError:
                 pass
         
-        return "Unknown"
+        return None
     
     def prepare_context(self, schema: Dict[str, Any]) -> str:
         """Prepare context string for LLM from schema.
         
+        Contexts are memoized by schema hash, so preparing the context for an
+        unchanged schema is a dictionary lookup.
+        
+        Args:
+            schema: Schema data
+            
+        Returns:
+            Context string for LLM
+        """
+        key = metadata_hash(schema)
+        context = self._context_cache.get(key)
+        
+        if context is None:
+            context = self._build_context(schema)
+            self._context_cache[key] = context
+            
+            # Keep only the most recently prepared contexts
+            while len(self._context_cache) > _CONTEXT_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
+        
+        return context
+    
+    def _build_context(self, schema: Dict[str, Any]) -> str:
+        """Build the context string for LLM from schema.
+        
         Args:
             schema: Schema data
             
         Returns:
             Context string for LLM
         """
-        context = SCHEMA_CONTEXT_HEADER
+        buf = [SCHEMA_CONTEXT_HEADER]
+        append = buf.append
+        
+        # Keep only the most connected tables if there are too many, in their original order
+        tables = schema.get('tables', [])
+        omitted_tables = len(tables) - config.MAX_TABLES_IN_CONTEXT
+        omitted_names = set()
+        if omitted_tables > 0:
+            table_degree = Counter()
+            for rel in schema.get('relationships', []):
+                table_degree[rel.get('fromTable', '')] += 1
+                table_degree[rel.get('toTable', '')] += 1
+            
+            ranked = sorted(range(len(tables)), key=lambda idx: table_degree[tables[idx].get('name', '')], reverse=True)
+            kept = set(ranked[:config.MAX_TABLES_IN_CONTEXT])
+            omitted_names = {table.get('name', '') for idx, table in enumerate(tables) if idx not in kept}
+            tables = [table for idx, table in enumerate(tables) if idx in kept]
         
         # Add tables section
-        context += SCHEMA_TABLES_SECTION
-        for table in schema.get('tables', []):
-            context += f"### Table: {table.get('name', '')}\n"
+        append(SCHEMA_TABLES_SECTION)
+        for table in tables:
+            append(f"### Table: {table.get('name', '')}\n")
             
-            # Add columns
-            if table.get('columns'):
-                context += "**Columns:**\n"
-                for column in table.get('columns', []):
-                    context += f"- {column.get('name', '')} ({column.get('dataType', '')})\n"
+            # Add columns, capped per table
+            columns = table.get('columns')
+            if columns:
+                append("**Columns:**\n")
+                for column in columns[:config.MAX_COLUMNS_PER_TABLE]:
+                    append(f"- {column.get('name', '')} ({column.get('dataType', '')})\n")
+                if len(columns) > config.MAX_COLUMNS_PER_TABLE:
+                    append(f"- … (+{len(columns) - config.MAX_COLUMNS_PER_TABLE} more columns)\n")
             
-            context += "\n"
+            append("\n")
         
-        # Add measures section
+        if omitted_tables > 0:
+            append(f"… (+{omitted_tables} more tables)\n\n")
+        
+        # Add measures section, skipping the measures of omitted tables
         if schema.get('measures'):
-            context += SCHEMA_MEASURES_SECTION
+            append(SCHEMA_MEASURES_SECTION)
+            omitted_measures = 0
             for measure in schema.get('measures', []):
                 table_name = measure.get('table', '')
-                context += f"### {measure.get('name', '')} ({table_name})\n"
-                context += f"```dax\n{measure.get('expression', '')}\n```\n\n"
+                if table_name in omitted_names:
+                    omitted_measures += 1
+                    continue
+                expression = measure.get('expression', '')
+                if len(expression) > config.MAX_MEASURE_EXPRESSION_CHARS:
+                    expression = expression[:config.MAX_MEASURE_EXPRESSION_CHARS] + "…"
+                append(f"### {measure.get('name', '')} ({table_name})\n")
+                append(f"```dax\n{expression}\n```\n\n")
+            
+            if omitted_measures:
+                append(f"… (+{omitted_measures} more measures in omitted tables)\n\n")
         
         # Add relationships section
         if schema.get('relationships'):
-            context += SCHEMA_RELATIONSHIPS_SECTION
+            append(SCHEMA_RELATIONSHIPS_SECTION)
             for rel in schema.get('relationships', []):
                 from_table = rel.get('fromTable', '')
                 from_column = rel.get('fromColumn', '')
@@ -237,6 +310,6 @@ class SchemaManager:
                 cardinality = f" ({rel.get('toCardinality', 'one')})" if 'toCardinality' in rel else ""
                 active = " (inactive)" if not rel.get('isActive', True) else ""
                 
-                context += f"- {from_table}.[{from_column}] → {to_table}.[{to_column}]{cardinality}{active}\n"
+                append(f"- {from_table}.[{from_column}] → {to_table}.[{to_column}]{cardinality}{active}\n")
         
-        return context
\ No newline at end of file
+        return "".join(buf)
\ No newline at end of file
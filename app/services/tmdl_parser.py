@@ -1,15 +1,188 @@
 # app/services/tmdl_parser.py
 
 import os
-import json
+import sys
 import re
+import mmap
+import orjson
 import logging
-from typing import Dict, List, Any, Optional
+from collections.abc import Mapping
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Files at least this large are decoded straight from a memory map rather than read into a buffer first
+_MMAP_MIN_BYTES = 64 * 1024
+
+# Patterns used to parse TMDL files, compiled once at import
+_RE_CULTURE = re.compile(r'culture:\s*([^\n]+)')
+_RE_SOURCE_QUERY_CULTURE = re.compile(r'sourceQueryCulture:\s*([^\n]+)')
+_RE_TABLE_REF = re.compile(r'ref table ([^\n]+)')
+_RE_ANNOTATION = re.compile(r'annotation ([^\s]+)\s*=\s*([^\n]+)')
+_RE_RELATIONSHIP_BLOCK = re.compile(r'relationship ([^\n]+)([^a-zA-Z0-9_][\s\S]*?)(?=relationship|$)')
+_RE_TABLE_NAME = re.compile(r'table ([^\n]+)')
+# Column, measure and partition block headers, and the keywords that end a block body
+_RE_TABLE_BLOCK_START = re.compile(r'(column|measure|partition) ([^\n]+)')
+_RE_TABLE_BLOCK_END = re.compile(r'column|measure|partition|annotation\s')
+_RE_SOURCE = re.compile(r'source\s*=\s*```([\s\S]*?)```')
+
+def _read_file(file_path: str) -> bytes:
+    """Read a whole file with one read sized from fstat.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        File contents
+    """
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size) if size else b""
+        if len(data) == size and size:
+            return data
+        
+        # Short read or unknown size, so keep reading until EOF
+        chunks = [data]
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+def _decode_tmdl(raw) -> str:
+    """Decode a TMDL file read in binary mode.
+    
+    Args:
+        raw: File contents as bytes or any other buffer, such as an mmap
+        
+    Returns:
+        Decoded text with newlines normalized the way text mode would
+    """
+    content = str(raw, 'utf-8', 'replace')
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return content
+
+def _read_tmdl(file_path: str) -> str:
+    """Read and decode a TMDL file.
+    
+    Large files are decoded directly from a memory map, which skips copying
+    the raw bytes into an intermediate buffer; small ones are cheaper to read.
+    
+    Args:
+        file_path: Path to the .tmdl file
+        
+    Returns:
+        Decoded file contents
+    """
+    if os.stat(file_path).st_size < _MMAP_MIN_BYTES:
+        return _decode_tmdl(_read_file(file_path))
+    
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _decode_tmdl(mapped)
+
+def _table_blocks(content: str) -> Iterator[Tuple[str, str, str]]:
+    """Split a table file into column, measure and partition blocks.
+    
+    Each block runs from its header line to the next block keyword (or
+    annotation) or the end of the file. Finding headers and block ends with
+    two plain searches keeps the scan linear, where a lazy body with a
+    lookahead would retry the lookahead at every character.
+    
+    Args:
+        content: Decoded table.tmdl contents
+        
+    Yields:
+        Tuples of block kind, header text and block body
+    """
+    # A block without a following keyword ends where $ would match: before a trailing newline
+    content_end = len(content) - 1 if content.endswith('\n') else len(content)
+    position = 0
+    while True:
+        start = _RE_TABLE_BLOCK_START.search(content, position)
+        if start is None:
+            return
+        end = _RE_TABLE_BLOCK_END.search(content, start.end())
+        position = end.start() if end else max(content_end, start.end())
+        yield start.group(1), start.group(2), content[start.end():position]
+
+def _extract_annotations(content: str) -> Dict[str, str]:
+    """Collect the annotation key/value pairs in a TMDL block."""
+    # Annotation names repeat across every column, so intern them
+    return {sys.intern(key.strip()): value.strip() for key, value in _RE_ANNOTATION.findall(content)}
+
+def _block_properties(content: str) -> Dict[str, str]:
+    """Read the key: value property lines of a TMDL block in one pass.
+    
+    Args:
+        content: Body of a column, measure, partition or relationship block
+        
+    Returns:
+        Dictionary of property name to stripped value, keeping the first occurrence of each
+    """
+    properties = {}
+    for line in content.split('\n'):
+        key, separator, value = line.partition(':')
+        if separator:
+            key = sys.intern(key.strip())
+            if key not in properties:
+                properties[key] = value.strip()
+    return properties
+
+def _split_column_reference(reference: str) -> Optional[Tuple[str, str]]:
+    """Split a Table.Column reference into unquoted table and column names.
+    
+    Args:
+        reference: Column reference as written in relationships.tmdl
+        
+    Returns:
+        Tuple of table and column name, or None if the reference is not qualified
+    """
+    parts = reference.strip().split('.')
+    if len(parts) != 2:
+        return None
+    return sys.intern(parts[0].strip("'")), parts[1].strip("'")
+
+class LazyTables(Mapping):
+    """Read-only mapping of table name to table information, parsed on first access."""
+    
+    def __init__(self, table_paths: Dict[str, str]):
+        """Initialize with the table files found in the project.
+        
+        Args:
+            table_paths: Dictionary of table name to table.tmdl path
+        """
+        self._paths = table_paths
+        self._parsed = {}
+    
+    def __getitem__(self, table_name: str) -> Dict[str, Any]:
+        table_info = self._parsed.get(table_name)
+        if table_info is None:
+            table_path = self._paths[table_name]
+            logger.info(f"Parsing table: {table_name}")
+            table_info = self._parsed[table_name] = TMDLParser.parse_table_file(table_path)
+        return table_info
+    
+    def __contains__(self, table_name: object) -> bool:
+        return table_name in self._paths
+    
+    def __iter__(self):
+        return iter(self._paths)
+    
+    def __len__(self) -> int:
+        return len(self._paths)
+    
+    def load_all(self) -> None:
+        """Parse every table that hasn't been accessed yet."""
+        for table_name in self._paths:
+            self[table_name]
+
 class TMDLParser:
     """Parser for Power BI TMDL files to extract semantic model information."""
     
@@ -20,7 +193,7 @@ class TMDLParser:
             base_directory: Path to the Power BI project directory
         """
         self.base_directory = base_directory
-        self.tables_info = {}
+        self.tables_info = LazyTables({})
         self.relationships = []
         self.model_info = {}
     
@@ -41,51 +214,46 @@ class TMDLParser:
                 "relationships": []
             }
         
+        # Index the base and definition directories once instead of probing each candidate path
+        base_entries = self._scan_directory(self.base_directory)
+        definition_entry = base_entries.get("definition")
+        if definition_entry is not None and definition_entry.is_dir():
+            definition_entries = self._scan_directory(definition_entry.path)
+        else:
+            definition_entries = {}
+        
         # Parse model.tmdl
-        model_path = os.path.join(self.base_directory, "model.tmdl")
-        if os.path.exists(model_path):
-            logger.info(f"Parsing model file: {model_path}")
-            self.model_info = self.parse_model_file(model_path)
+        model_entry = base_entries.get("model.tmdl") or definition_entries.get("model.tmdl")
+        if model_entry is not None:
+            logger.info(f"Parsing model file: {model_entry.path}")
+            self.model_info = self.parse_model_file(model_entry.path)
         else:
-            model_path = os.path.join(self.base_directory, "definition", "model.tmdl")
-            if os.path.exists(model_path):
-                logger.info(f"Parsing model file: {model_path}")
-                self.model_info = self.parse_model_file(model_path)
-            else:
-                logger.warning("No model.tmdl found")
+            logger.warning("No model.tmdl found")
         
         # Parse relationships.tmdl
-        relationships_path = os.path.join(self.base_directory, "relationships.tmdl")
-        if os.path.exists(relationships_path):
-            logger.info(f"Parsing relationships file: {relationships_path}")
-            self.relationships = self.parse_relationships_file(relationships_path)
+        relationships_entry = base_entries.get("relationships.tmdl") or definition_entries.get("relationships.tmdl")
+        if relationships_entry is not None:
+            logger.info(f"Parsing relationships file: {relationships_entry.path}")
+            self.relationships = self.parse_relationships_file(relationships_entry.path)
         else:
-            relationships_path = os.path.join(self.base_directory, "definition", "relationships.tmdl")
-            if os.path.exists(relationships_path):
-                logger.info(f"Parsing relationships file: {relationships_path}")
-                self.relationships = self.parse_relationships_file(relationships_path)
-            else:
-                logger.warning("No relationships.tmdl found")
+            logger.warning("No relationships.tmdl found")
         
         # Find the tables directory (might be "tables" or "definition/tables")
-        tables_dir = os.path.join(self.base_directory, "tables")
-        if not os.path.exists(tables_dir):
-            tables_dir = os.path.join(self.base_directory, "definition", "tables")
-            if not os.path.exists(tables_dir):
-                logger.warning("No tables directory found")
-                tables_dir = None
+        tables_entry = base_entries.get("tables") or definition_entries.get("tables")
+        if tables_entry is None:
+            logger.warning("No tables directory found")
         
         # Parse table files
-        if tables_dir:
-            logger.info(f"Found tables directory: {tables_dir}")
-            table_files = [f for f in os.listdir(tables_dir) if f.endswith(".tmdl")]
+        if tables_entry is not None:
+            logger.info(f"Found tables directory: {tables_entry.path}")
+            with os.scandir(tables_entry.path) as entries:
+                table_files = [(entry.name, entry.path) for entry in entries
+                               if entry.name.endswith(".tmdl") and entry.is_file()]
             logger.info(f"Found {len(table_files)} table files")
             
-            for file_name in table_files:
-                table_path = os.path.join(tables_dir, file_name)
-                table_name = file_name.replace(".tmdl", "")
-                logger.info(f"Parsing table: {table_name}")
-                self.tables_info[table_name] = self.parse_table_file(table_path)
+            # Tables are parsed when first accessed
+            self.tables_info = LazyTables({file_name.replace(".tmdl", ""): table_path
+                                           for file_name, table_path in table_files})
         
         # Compile everything into a structured output
         result = {
@@ -96,6 +264,32 @@ class TMDLParser:
         
         return result
     
+    def get_table(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """Get the parsed information for one table, parsing only that table's file.
+        
+        Args:
+            table_name: Name of the table file without the .tmdl extension
+            
+        Returns:
+            Dictionary with table information or None if the table doesn't exist
+        """
+        if not self.tables_info and not self.relationships:
+            self.parse_project()
+        return self.tables_info.get(table_name)
+    
+    @staticmethod
+    def _scan_directory(path: str) -> Dict[str, os.DirEntry]:
+        """List a directory once, keyed by entry name.
+        
+        Args:
+            path: Directory to scan
+            
+        Returns:
+            Dictionary of entry name to directory entry
+        """
+        with os.scandir(path) as entries:
+            return {entry.name: entry for entry in entries}
+    
     def parse_model_file(self, file_path: str) -> Dict[str, Any]:
         """Parse model.tmdl file to extract model information.
         
@@ -113,27 +307,24 @@ class TMDLParser:
         }
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-                # Extract culture
-                culture_match = re.search(r'culture:\s*([^\n]+)', content)
-                if culture_match:
-                    model_info["culture"] = culture_match.group(1).strip()
-                
-                # Extract source query culture
-                source_culture_match = re.search(r'sourceQueryCulture:\s*([^\n]+)', content)
-                if source_culture_match:
-                    model_info["sourceQueryCulture"] = source_culture_match.group(1).strip()
-                
-                # Extract table references
-                table_refs = re.findall(r'ref table ([^\n]+)', content)
-                model_info["tables"] = [table.strip() for table in table_refs]
-                
-                # Extract annotations
-                annotations = re.findall(r'annotation ([^\s]+)\s*=\s*([^\n]+)', content)
-                for key, value in annotations:
-                    model_info["annotations"][key.strip()] = value.strip()
+            content = _read_tmdl(file_path)
+            
+            # Extract culture
+            culture_match = _RE_CULTURE.search(content)
+            if culture_match:
+                model_info["culture"] = culture_match.group(1).strip()
+            
+            # Extract source query culture
+            source_culture_match = _RE_SOURCE_QUERY_CULTURE.search(content)
+            if source_culture_match:
+                model_info["sourceQueryCulture"] = source_culture_match.group(1).strip()
+            
+            # Extract table references
+            table_refs = _RE_TABLE_REF.findall(content)
+            model_info["tables"] = [table.strip() for table in table_refs]
+            
+            # Extract annotations
+            model_info["annotations"] = _extract_annotations(content)
         except Exception as e:
             logger.error(f"Error parsing model file: {e}")
         
@@ -151,57 +342,51 @@ class TMDLParser:
         relationships = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = _read_tmdl(file_path)
+            
+            # Find all relationship blocks
+            relationship_blocks = _RE_RELATIONSHIP_BLOCK.findall(content)
+            
+            for rel_id, rel_content in relationship_blocks:
+                relationship = {
+                    "id": rel_id.strip(),
+                    "fromTable": "",
+                    "fromColumn": "",
+                    "toTable": "",
+                    "toColumn": "",
+                    "isActive": True,
+                    "crossFilteringBehavior": "automatic",
+                    "joinOnDateBehavior": "datePartOnly" if "joinOnDateBehavior" in rel_content else None
+                }
                 
-                # Find all relationship blocks
-                relationship_blocks = re.findall(r'relationship ([^\n]+)([^a-zA-Z0-9_][\s\S]*?)(?=relationship|$)', content)
+                # Extract relationship properties
+                properties = _block_properties(rel_content)
                 
-                for rel_id, rel_content in relationship_blocks:
-                    relationship = {
-                        "id": rel_id.strip(),
-                        "fromTable": "",
-                        "fromColumn": "",
-                        "toTable": "",
-                        "toColumn": "",
-                        "isActive": True,
-                        "crossFilteringBehavior": "automatic",
-                        "joinOnDateBehavior": "datePartOnly" if "joinOnDateBehavior" in rel_content else None
-                    }
-                    
-                    # Extract relationship properties
-                    from_match = re.search(r'fromColumn:\s*([^\n]+)', rel_content)
-                    to_match = re.search(r'toColumn:\s*([^\n]+)', rel_content)
-                    is_active_match = re.search(r'isActive:\s*([^\n]+)', rel_content)
-                    
-                    if from_match:
-                        from_parts = from_match.group(1).strip().split('.')
-                        if len(from_parts) == 2:
-                            relationship["fromTable"] = from_parts[0].strip("'")
-                            relationship["fromColumn"] = from_parts[1].strip("'")
-                    
-                    if to_match:
-                        to_parts = to_match.group(1).strip().split('.')
-                        if len(to_parts) == 2:
-                            relationship["toTable"] = to_parts[0].strip("'")
-                            relationship["toColumn"] = to_parts[1].strip("'")
-                    
-                    if is_active_match:
-                        is_active_value = is_active_match.group(1).strip().lower()
-                        relationship["isActive"] = is_active_value == "true"
-                    
-                    # Extract cardinality
-                    to_cardinality_match = re.search(r'toCardinality:\s*([^\n]+)', rel_content)
-                    if to_cardinality_match:
-                        relationship["toCardinality"] = to_cardinality_match.group(1).strip()
-                    
-                    relationships.append(relationship)
+                if "fromColumn" in properties:
+                    from_parts = _split_column_reference(properties["fromColumn"])
+                    if from_parts:
+                        relationship["fromTable"], relationship["fromColumn"] = from_parts
+                
+                if "toColumn" in properties:
+                    to_parts = _split_column_reference(properties["toColumn"])
+                    if to_parts:
+                        relationship["toTable"], relationship["toColumn"] = to_parts
+                
+                if "isActive" in properties:
+                    relationship["isActive"] = properties["isActive"].lower() == "true"
+                
+                # Extract cardinality
+                if "toCardinality" in properties:
+                    relationship["toCardinality"] = properties["toCardinality"]
+                
+                relationships.append(relationship)
         except Exception as e:
             logger.error(f"Error parsing relationships file: {e}")
         
         return relationships
     
-    def parse_table_file(self, file_path: str) -> Dict[str, Any]:
+    @staticmethod
+    def parse_table_file(file_path: str) -> Dict[str, Any]:
         """Parse a table.tmdl file to extract table schema and measures.
         
         Args:
@@ -219,126 +404,111 @@ class TMDLParser:
         }
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = _read_tmdl(file_path)
+            
+            # Extract table name
+            table_match = _RE_TABLE_NAME.search(content)
+            if table_match:
+                table_info["name"] = table_match.group(1).strip()
+            
+            # Split the file into column, measure and partition blocks
+            blocks = {"column": [], "measure": [], "partition": []}
+            for kind, block_name, block_content in _table_blocks(content):
+                blocks[kind].append((block_name, block_content))
+            
+            # Extract columns
+            for col_name, col_content in blocks["column"]:
+                column = {
+                    "name": col_name.strip(),
+                    "dataType": "",
+                    "formatString": "",
+                    "lineageTag": "",
+                    "summarizeBy": "none",
+                    "annotations": {}
+                }
                 
-                # Extract table name
-                table_match = re.search(r'table ([^\n]+)', content)
-                if table_match:
-                    table_info["name"] = table_match.group(1).strip()
+                # Extract column properties
+                properties = _block_properties(col_content)
+                for key in ("dataType", "formatString", "lineageTag", "summarizeBy"):
+                    if key in properties:
+                        column[key] = properties[key]
                 
-                # Extract columns
-                column_blocks = re.findall(r'column ([^\n]+)([\s\S]*?)(?=column|measure|partition|annotation\s|$)', content)
-                for col_name, col_content in column_blocks:
-                    column = {
-                        "name": col_name.strip(),
-                        "dataType": "",
-                        "formatString": "",
-                        "lineageTag": "",
-                        "summarizeBy": "none",
-                        "annotations": {}
-                    }
-                    
-                    # Extract column properties
-                    data_type_match = re.search(r'dataType:\s*([^\n]+)', col_content)
-                    if data_type_match:
-                        column["dataType"] = data_type_match.group(1).strip()
-                    
-                    format_string_match = re.search(r'formatString:\s*([^\n]+)', col_content)
-                    if format_string_match:
-                        column["formatString"] = format_string_match.group(1).strip()
-                    
-                    lineage_tag_match = re.search(r'lineageTag:\s*([^\n]+)', col_content)
-                    if lineage_tag_match:
-                        column["lineageTag"] = lineage_tag_match.group(1).strip()
-                    
-                    summarize_by_match = re.search(r'summarizeBy:\s*([^\n]+)', col_content)
-                    if summarize_by_match:
-                        column["summarizeBy"] = summarize_by_match.group(1).strip()
-                    
-                    # Extract column annotations
-                    col_annotations = re.findall(r'annotation ([^\s]+)\s*=\s*([^\n]+)', col_content)
-                    for key, value in col_annotations:
-                        column["annotations"][key.strip()] = value.strip()
-                    
-                    table_info["columns"].append(column)
+                # Data types and summarization come from a handful of values, so share one string each
+                column["dataType"] = sys.intern(column["dataType"])
+                column["summarizeBy"] = sys.intern(column["summarizeBy"])
                 
-                # Extract measures
-                measure_blocks = re.findall(r'measure ([^\n]+)([\s\S]*?)(?=measure|column|partition|annotation\s|$)', content)
-                for measure_name, measure_content in measure_blocks:
-                    measure = {
-                        "name": measure_name.strip(),
-                        "expression": "",
-                        "formatString": "",
-                        "lineageTag": "",
-                        "annotations": {}
-                    }
-                    
-                    # Look for expression first - might be on the same line
-                    if '=' in measure_name:
-                        name_parts = measure_name.split('=', 1)
-                        measure["name"] = name_parts[0].strip()
-                        expression_start = name_parts[1].strip()
-                        
-                        # Check if there's more expression in the content
-                        expr_lines = [expression_start]
-                        for line in measure_content.split('\n'):
-                            line = line.strip()
-                            if line and not line.startswith('formatString:') and not line.startswith('lineageTag:') and not line.startswith('annotation'):
-                                expr_lines.append(line)
-                        
-                        measure["expression"] = '\n'.join(expr_lines)
-                    else:
-                        # Expression might be on multiple lines
-                        expr_lines = []
-                        for line in measure_content.split('\n'):
-                            line = line.strip()
-                            if line and not line.startswith('formatString:') and not line.startswith('lineageTag:') and not line.startswith('annotation'):
-                                expr_lines.append(line)
-                        
-                        measure["expression"] = '\n'.join(expr_lines)
-                    
-                    # Extract measure properties
-                    format_string_match = re.search(r'formatString:\s*([^\n]+)', measure_content)
-                    if format_string_match:
-                        measure["formatString"] = format_string_match.group(1).strip()
-                    
-                    lineage_tag_match = re.search(r'lineageTag:\s*([^\n]+)', measure_content)
-                    if lineage_tag_match:
-                        measure["lineageTag"] = lineage_tag_match.group(1).strip()
-                    
-                    # Extract measure annotations
-                    measure_annotations = re.findall(r'annotation ([^\s]+)\s*=\s*([^\n]+)', measure_content)
-                    for key, value in measure_annotations:
-                        measure["annotations"][key.strip()] = value.strip()
-                    
-                    table_info["measures"].append(measure)
+                # Extract column annotations
+                column["annotations"] = _extract_annotations(col_content)
                 
-                # Extract partitions
-                partition_blocks = re.findall(r'partition ([^\n]+)([\s\S]*?)(?=partition|column|measure|annotation\s|$)', content)
-                for partition_name, partition_content in partition_blocks:
-                    partition = {
-                        "name": partition_name.strip(),
-                        "mode": "",
-                        "source": ""
-                    }
+                table_info["columns"].append(column)
+            
+            # Extract measures
+            for measure_name, measure_content in blocks["measure"]:
+                measure = {
+                    "name": measure_name.strip(),
+                    "expression": "",
+                    "formatString": "",
+                    "lineageTag": "",
+                    "annotations": {}
+                }
+                
+                # Look for expression first - might be on the same line
+                if '=' in measure_name:
+                    name_parts = measure_name.split('=', 1)
+                    measure["name"] = name_parts[0].strip()
+                    expression_start = name_parts[1].strip()
                     
-                    # Extract partition properties
-                    mode_match = re.search(r'mode:\s*([^\n]+)', partition_content)
-                    if mode_match:
-                        partition["mode"] = mode_match.group(1).strip()
+                    # Check if there's more expression in the content
+                    expr_lines = [expression_start]
+                    for line in measure_content.split('\n'):
+                        line = line.strip()
+                        if line and not line.startswith('formatString:') and not line.startswith('lineageTag:') and not line.startswith('annotation'):
+                            expr_lines.append(line)
                     
-                    # Extract source (can be multi-line)
-                    source_match = re.search(r'source\s*=\s*```([\s\S]*?)```', partition_content)
-                    if source_match:
-                        partition["source"] = source_match.group(1).strip()
+                    measure["expression"] = '\n'.join(expr_lines)
+                else:
+                    # Expression might be on multiple lines
+                    expr_lines = []
+                    for line in measure_content.split('\n'):
+                        line = line.strip()
+                        if line and not line.startswith('formatString:') and not line.startswith('lineageTag:') and not line.startswith('annotation'):
+                            expr_lines.append(line)
                     
-                    table_info["partitions"].append(partition)
+                    measure["expression"] = '\n'.join(expr_lines)
+                
+                # Extract measure properties
+                properties = _block_properties(measure_content)
+                for key in ("formatString", "lineageTag"):
+                    if key in properties:
+                        measure[key] = properties[key]
+                
+                # Extract measure annotations
+                measure["annotations"] = _extract_annotations(measure_content)
+                
+                table_info["measures"].append(measure)
+            
+            # Extract partitions
+            for partition_name, partition_content in blocks["partition"]:
+                partition = {
+                    "name": partition_name.strip(),
+                    "mode": "",
+                    "source": ""
+                }
                 
-                # Extract table annotations
-                table_annotations = re.findall(r'annotation ([^\s]+)\s*=\s*([^\n]+)', content)
-                for key, value in table_annotations:
-                    table_info["annotations"][key.strip()] = value.strip()
+                # Extract partition properties
+                properties = _block_properties(partition_content)
+                if "mode" in properties:
+                    partition["mode"] = properties["mode"]
+                
+                # Extract source (can be multi-line)
+                source_match = _RE_SOURCE.search(partition_content)
+                if source_match:
+                    partition["source"] = source_match.group(1).strip()
+                
+                table_info["partitions"].append(partition)
+            
+            # Extract table annotations
+            table_info["annotations"] = _extract_annotations(content)
         except Exception as e:
             logger.error(f"Error parsing table file: {e}")
         
@@ -361,30 +531,33 @@ class TMDLParser:
         }
         
         # Process tables and their columns
+        self.tables_info.load_all()
         for table_name, table_info in self.tables_info.items():
-            clean_table = {
-                "name": table_info.get('name', table_name),
-                "columns": []
-            }
-            
-            # Add columns
-            for column in table_info.get('columns', []):
-                clean_table['columns'].append({
-                    "name": column.get('name', ''),
-                    "dataType": column.get('dataType', ''),
-                    "summarizeBy": column.get('summarizeBy', 'none')
-                })
+            clean_name = table_info.get('name', table_name)
             
-            clean_model['tables'].append(clean_table)
+            # Keep only the column fields the clean schema exposes
+            clean_model['tables'].append({
+                "name": clean_name,
+                "columns": [
+                    {
+                        "name": column.get('name', ''),
+                        "dataType": column.get('dataType', ''),
+                        "summarizeBy": column.get('summarizeBy', 'none')
+                    }
+                    for column in table_info.get('columns', [])
+                ]
+            })
             
             # Collect measures
-            for measure in table_info.get('measures', []):
-                clean_model['measures'].append({
+            clean_model['measures'].extend(
+                {
                     "name": measure.get('name', ''),
                     "expression": measure.get('expression', ''),
-                    "table": table_info.get('name', table_name),
+                    "table": clean_name,
                     "formatString": measure.get('formatString', '')
-                })
+                }
+                for measure in table_info.get('measures', [])
+            )
         
         # Process relationships
         for relationship in self.relationships:
@@ -410,7 +583,8 @@ class TMDLParser:
         Args:
             output_file: Path to output JSON file
             clean: Whether to output clean schema or raw parsed data
-            indent: JSON indentation level
+            indent: JSON indentation level; orjson only indents by 2, so any
+                non-zero value gives 2 and 0 writes compact JSON
         """
         # Parse project if not already parsed
         if not self.tables_info and not self.relationships:
@@ -422,13 +596,13 @@ class TMDLParser:
         else:
             result = {
                 "model": self.model_info,
-                "tables": self.tables_info,
+                "tables": dict(self.tables_info),
                 "relationships": self.relationships
             }
         
         # Write to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=indent)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 if indent else None))
         
         logger.info(f"Schema exported to: {output_file}")
         logger.info(f"Tables: {len(result.get('tables', []))}")
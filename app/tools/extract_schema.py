@@ -11,7 +11,7 @@ Usage:
 
 import os
 import sys
-import json
+import orjson
 import argparse
 import logging
 from typing import Dict, Any
@@ -50,7 +50,7 @@ def extract_schema(directory: str, output_file: str, raw: bool = False) -> None:
         logger.info("Generating raw schema...")
         result = {
             "model": parser.model_info,
-            "tables": parser.tables_info,
+            "tables": dict(parser.tables_info),
             "relationships": parser.relationships
         }
     else:
@@ -58,8 +58,8 @@ def extract_schema(directory: str, output_file: str, raw: bool = False) -> None:
         result = parser.generate_clean_json()
     
     # Write to file
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
     
     # Output summary
     if raw:
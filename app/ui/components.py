@@ -1,19 +1,21 @@
 import streamlit as st
+from typing import List, Dict, Any, Optional, Tuple
 from app.utils.formatters import format_dax
 
-def render_chat_message(role: str, content: str):
+def render_chat_message(role: str, content: str, rendered: Optional[Tuple] = None):
     """Render a chat message with appropriate styling.
     
     Args:
         role: Either 'user' or 'assistant'
         content: The message content
+        rendered: Result of format_dax(content) if it was computed when the message was stored
     """
     with st.container():
         st.markdown(f"**{role.capitalize()}**")
         
         if role == 'assistant':
-            # Format the content and extract code blocks
-            cleaned_text, code_blocks = format_dax(content)
+            # Format the content and extract code blocks, unless that was done when it was stored
+            cleaned_text, code_blocks = rendered if rendered is not None else format_dax(content)
             
             # Split the cleaned text by code block markers
             text_parts = cleaned_text.split("[[CODE_BLOCK]]")
@@ -32,6 +34,49 @@ def render_chat_message(role: str, content: str):
         
         st.markdown("---")
 
+def render_chat_history(messages: List[Dict[str, Any]]):
+    """Render the stored chat history with as few Streamlit elements as possible.
+    
+    Each message's markdown (role label, text and separator) is joined into a
+    single st.markdown call; only DAX code blocks get their own st.code element
+    for highlighting. Messages are never batched together, so unbalanced
+    markdown in one message (an open ``` or **) can't reformat the next.
+    
+    Args:
+        messages: Messages from memory, optionally carrying a precomputed 'rendered' form
+    """
+    pending = []
+    
+    for message in messages:
+        role = message["role"]
+        content = message["content"]
+        pending.append(f"**{role.capitalize()}**")
+        
+        if role == 'assistant':
+            rendered = message.get("rendered")
+            cleaned_text, code_blocks = rendered if rendered is not None else format_dax(content)
+            
+            for i, part in enumerate(cleaned_text.split("[[CODE_BLOCK]]")):
+                if part.strip():
+                    pending.append(part)
+                
+                # Flush the text so far so the code block appears in order
+                if i < len(code_blocks):
+                    _flush_markdown(pending)
+                    st.code(code_blocks[i], language="sql")  # Using SQL for highlighting
+        else:
+            pending.append(content)
+        
+        pending.append("---")
+        _flush_markdown(pending)
+
+def _flush_markdown(parts: List[str]):
+    """Render buffered markdown parts as one element and empty the buffer."""
+    if parts:
+        # Blank lines keep each part its own block, so '---' stays a rule rather than a heading underline
+        st.markdown("\n\n".join(parts))
+        parts.clear()
+
 def render_measure_card(name: str, expression: str):
     """Render a card displaying a DAX measure.
     
@@ -1,7 +1,10 @@
 # app/ui/main_page.py
+import time
 import streamlit as st
-from app.services.llm_service import query_claude, memory
-from app.ui.components import render_chat_message
+from typing import Iterator
+from app.services.llm_service import stream_claude, memory
+from app.ui.components import render_chat_message, render_chat_history
+import config
 
 def render_main_ui():
     """Render the main UI area with chat interface."""
@@ -13,29 +16,55 @@ def render_main_ui():
         return
     
     # Display chat messages from LangChain memory
-    for message in memory.get_messages():
-        role = message["role"]
-        content = message["content"]
-        
-        # Render chat message
-        render_chat_message(role, content)
+    render_chat_history(memory.get_messages())
     
     # Chat input
     with st.container():
         user_input = st.chat_input("Ask me about measures or visualizations...")
         
+        # Fall back to an example prompt picked in the sidebar
+        if not user_input:
+            user_input = st.session_state.pop("pending_prompt", None)
+        
         if user_input:
-            # Add user message to display (already added to memory in query_claude)
+            # Add user message to display (added to memory when stream_claude starts the turn)
             render_chat_message("user", user_input)
             
-            # Get response from Claude
-            with st.spinner("Thinking..."):
-                response = query_claude(user_input, st.session_state.model_context)
-            
-            # Render assistant message (already added to memory in query_claude)
-            render_chat_message("assistant", response)
-            st.rerun()
+            # Stream the response from Claude as it is generated; it is added to memory in
+            # stream_claude and rendered from there on the next run, so no rerun is needed
+            with st.container():
+                st.markdown("**Assistant**")
+                st.write_stream(_throttle_stream(stream_claude(user_input, st.session_state.model_context),
+                                                config.STREAM_RENDER_INTERVAL))
+                st.markdown("---")
 
     # Footer
     st.markdown("---")
-    st.markdown("👉 **Tip:** Be specific about what measures or visualizations you need.")
\ No newline at end of file
+    st.markdown("👉 **Tip:** Be specific about what measures or visualizations you need.")
+
+def _throttle_stream(chunks: Iterator[str], interval: float) -> Iterator[str]:
+    """Coalesce streamed text so the reply is redrawn at most once per interval.
+    
+    st.write_stream re-sends the whole reply so far for every chunk it gets, so
+    passing on each token makes streaming quadratic in the reply length.
+    
+    Args:
+        chunks: Text chunks as they arrive
+        interval: Minimum seconds between yielded chunks
+        
+    Yields:
+        Text received since the previous yield
+    """
+    pending = []
+    last_yield = float("-inf")
+    
+    for chunk in chunks:
+        pending.append(chunk)
+        now = time.monotonic()
+        if now - last_yield >= interval:
+            yield "".join(pending)
+            pending.clear()
+            last_yield = now
+    
+    if pending:
+        yield "".join(pending)
\ No newline at end of file
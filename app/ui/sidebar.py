@@ -7,14 +7,21 @@ import streamlit as st
 import traceback
 import zipfile
 import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, Tuple, Callable
 from app.services.schema_manager import SchemaManager
-from app.services.context_builder import generate_model_context
-from app.services.llm_service import query_claude, memory  # Import the memory instance
+from app.services.context_builder import generate_model_context, metadata_hash
+from app.services.llm_service import memory, invalidate_response_cache  # Import the memory instance
 import config
 
 # Initialize schema manager
 schema_manager = SchemaManager()
 
+# Uploads are extracted off the script thread so the widgets stay responsive
+_EXTRACT_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+_EXTRACT_POLL_SECONDS = 0.5
+
 def render_sidebar():
     """Render the sidebar UI with file upload and examples."""
     with st.sidebar:
@@ -44,27 +51,36 @@ def render_sidebar():
         if getattr(st.session_state, 'file_uploaded', False) and hasattr(st.session_state, 'metadata'):
             _render_report_summary()
             
-            # Add chat controls here
+            # Add chat controls here; the main page renders after the sidebar,
+            # so it already shows the cleared history in this run
             if st.button("🗑️ Clear Chat"):
                 memory.clear_history()
-                st.rerun()
                 
             _render_example_prompts()
         if st.session_state.file_uploaded:
-            st.subheader("Memory Debug")
-            if st.checkbox("Show memory contents"):
-                # Get all messages in memory
-                messages = memory.get_messages()
-                
-                # Display message count
-                st.write(f"Messages in memory: {len(messages)}")
-                
-                # Display each message
-                for i, msg in enumerate(messages):
-                    st.write(f"Message {i+1}:")
-                    st.write(f"Role: {msg['role']}")
-                    st.write(f"Content: {msg['content'][:50]}..." if len(msg['content']) > 50 else f"Content: {msg['content']}")
-                    st.write("---")
+            _render_memory_debug()
+
+@st.experimental_fragment
+def _render_memory_debug():
+    """Render the memory debug panel.
+    
+    Runs as a fragment so toggling the checkbox reruns only this panel
+    rather than the whole page and chat history.
+    """
+    st.subheader("Memory Debug")
+    if st.checkbox("Show memory contents"):
+        # Get all messages in memory
+        messages = memory.get_messages()
+        
+        # Display message count
+        st.write(f"Messages in memory: {len(messages)}")
+        
+        # Display each message
+        for i, msg in enumerate(messages):
+            st.write(f"Message {i+1}:")
+            st.write(f"Role: {msg['role']}")
+            st.write(f"Content: {msg['content'][:50]}..." if len(msg['content']) > 50 else f"Content: {msg['content']}")
+            st.write("---")
 
 def _render_pbix_upload():
     """Render PBIX file upload interface."""
@@ -74,8 +90,9 @@ def _render_pbix_upload():
     if uploaded_file and not st.session_state.file_uploaded:
         with st.spinner("Processing PBIX file..."):
             try:
-                # Extract metadata with schema manager
-                metadata = schema_manager.extract_from_pbix(uploaded_file)
+                # Extract metadata and generate context for Claude off the script thread
+                metadata, model_context, metadata_key = _background_result(
+                    ("pbix", uploaded_file.file_id), _load_pbix, uploaded_file)
                 
                 # Check if any data was extracted
                 if not metadata.get('tables') and not metadata.get('relationships') and not metadata.get('visualizations'):
@@ -86,12 +103,14 @@ def _render_pbix_upload():
                 # Store metadata in session state
                 st.session_state.metadata = metadata
                 
-                # Generate context for Claude
-                model_context = generate_model_context(metadata)
+                # Drop cached responses for the previously loaded model
+                invalidate_response_cache(st.session_state.model_context)
                 st.session_state.model_context = model_context
                 
                 # Clear the memory when loading a new file
                 memory.clear_history()
+                st.session_state.metadata_hash = metadata_key
+                memory.set_context("pbi_context_hash", st.session_state.metadata_hash)
                 
                 st.session_state.file_uploaded = True
                 st.success("PBIX file processed successfully!")
@@ -111,51 +130,29 @@ def _render_tmdl_upload():
     if uploaded_zip and not st.session_state.file_uploaded:
         with st.spinner("Processing TMDL files..."):
             try:
-                # Create a temporary directory
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    # Extract the zip file
-                    zip_path = os.path.join(temp_dir, "upload.zip")
-                    with open(zip_path, "wb") as f:
-                        f.write(uploaded_zip.getvalue())
-                    
-                    # Extract zip contents
-                    extract_dir = os.path.join(temp_dir, "extract")
-                    os.makedirs(extract_dir, exist_ok=True)
-                    
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(extract_dir)
-                    
-                    # Find the root directory of the project
-                    project_dir = extract_dir
-                    contents = os.listdir(project_dir)
-                    
-                    # If there's a single directory and it contains the project files, use that
-                    if len(contents) == 1 and os.path.isdir(os.path.join(project_dir, contents[0])):
-                        if os.path.exists(os.path.join(project_dir, contents[0], "model.tmdl")) or \
-                           os.path.exists(os.path.join(project_dir, contents[0], "definition", "model.tmdl")):
-                            project_dir = os.path.join(project_dir, contents[0])
-                    
-                    # Extract schema using schema manager
-                    metadata = schema_manager.extract_from_tmdl(project_dir)
-                    
-                    # Check if any data was extracted
-                    if not metadata.get('tables') and not metadata.get('relationships') and not metadata.get('measures', []):
-                        st.warning("No data could be extracted from the TMDL files.")
-                        st.info("Please check the structure of your ZIP file.")
-                        return
-                    
-                    # Store metadata in session state
-                    st.session_state.metadata = metadata
-                    
-                    # Generate context for Claude
-                    model_context = schema_manager.prepare_context(metadata)
-                    st.session_state.model_context = model_context
-                    
-                    # Clear the memory when loading a new file
-                    memory.clear_history()
-                    
-                    st.session_state.file_uploaded = True
-                    st.success("TMDL files processed successfully!")
+                # Extract the files and schema off the script thread
+                metadata, model_context, metadata_key = _background_result(
+                    ("tmdl", uploaded_zip.file_id), _load_tmdl, uploaded_zip)
+                
+                # Check if any data was extracted
+                if not metadata.get('tables') and not metadata.get('relationships') and not metadata.get('measures', []):
+                    st.warning("No data could be extracted from the TMDL files.")
+                    st.info("Please check the structure of your ZIP file.")
+                    return
+                
+                # Store metadata in session state
+                st.session_state.metadata = metadata
+                st.session_state.metadata_hash = metadata_key
+                
+                # Drop cached responses for the previously loaded model
+                invalidate_response_cache(st.session_state.model_context)
+                st.session_state.model_context = model_context
+                
+                # Clear the memory when loading a new file
+                memory.clear_history()
+                
+                st.session_state.file_uploaded = True
+                st.success("TMDL files processed successfully!")
             
             except Exception as e:
                 st.error("Error processing TMDL files")
@@ -163,6 +160,101 @@ def _render_tmdl_upload():
                     st.code(traceback.format_exc())
                 return
 
+def _background_result(job_key: Tuple[str, str], fn: Callable, *args) -> Any:
+    """Run an extraction on the background pool and return its result once done.
+    
+    The pending future is kept in session state. While it runs, each script run
+    waits up to _EXTRACT_POLL_SECONDS and then reruns, so the page stays
+    responsive instead of blocking until the extraction finishes.
+    
+    Args:
+        job_key: File type and upload ID the job belongs to
+        fn: Extraction function to run
+        *args: Arguments for fn
+        
+    Returns:
+        Result of fn (its exception is re-raised)
+    """
+    job = st.session_state.get("extract_job")
+    if job is None or job[0] != job_key:
+        job = st.session_state.extract_job = (job_key, _EXTRACT_EXECUTOR.submit(fn, *args))
+    
+    future = job[1]
+    if not wait([future], timeout=_EXTRACT_POLL_SECONDS).done:
+        st.rerun()
+    
+    del st.session_state.extract_job
+    return future.result()
+
+def _load_pbix(uploaded_file) -> Tuple[Dict[str, Any], str, str]:
+    """Extract a PBIX file's metadata, Claude context, and metadata hash.
+    
+    Runs on the background pool, so it must not call Streamlit.
+    """
+    metadata = schema_manager.extract_from_pbix(uploaded_file)
+    return metadata, generate_model_context(metadata), metadata_hash(metadata)
+
+def _load_tmdl(uploaded_zip) -> Tuple[Dict[str, Any], str, str]:
+    """Extract a TMDL zip's schema, Claude context, and metadata hash.
+    
+    Runs on the background pool, so it must not call Streamlit.
+    """
+    # Create a temporary directory
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Extract zip contents straight from the in-memory upload
+        extract_dir = os.path.join(temp_dir, "extract")
+        os.makedirs(extract_dir, exist_ok=True)
+        
+        with zipfile.ZipFile(uploaded_zip, 'r') as zip_ref:
+            _extract_zip(zip_ref, extract_dir)
+        
+        # Find the root directory of the project
+        project_dir = extract_dir
+        contents = os.listdir(project_dir)
+        
+        # If there's a single directory and it contains the project files, use that
+        if len(contents) == 1 and os.path.isdir(os.path.join(project_dir, contents[0])):
+            if os.path.exists(os.path.join(project_dir, contents[0], "model.tmdl")) or \
+               os.path.exists(os.path.join(project_dir, contents[0], "definition", "model.tmdl")):
+                project_dir = os.path.join(project_dir, contents[0])
+        
+        # Extract schema using schema manager
+        metadata = schema_manager.extract_from_tmdl(project_dir)
+    
+    return metadata, schema_manager.prepare_context(metadata), metadata_hash(metadata)
+
+def _extract_zip(zip_ref: zipfile.ZipFile, extract_dir: str) -> None:
+    """Extract a zip archive, spreading the members over a thread pool.
+    
+    Decompression releases the GIL, so threads overlap it with the file
+    writes. Directories are created up front so the workers don't race to
+    create the same parent directory.
+    
+    Args:
+        zip_ref: Open zip archive
+        extract_dir: Directory to extract into
+    """
+    members = zip_ref.infolist()
+    if len(members) < 16:
+        zip_ref.extractall(extract_dir)
+        return
+    
+    root = os.path.realpath(extract_dir)
+    files = []
+    for member in members:
+        if member.is_dir():
+            zip_ref.extract(member, extract_dir)
+            continue
+        
+        # Only pre-create directories that stay inside the extraction root; ZipFile sanitizes other paths itself
+        parent = os.path.dirname(os.path.realpath(os.path.join(root, member.filename)))
+        if parent == root or parent.startswith(root + os.sep):
+            os.makedirs(parent, exist_ok=True)
+        files.append(member)
+    
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        list(executor.map(lambda member: zip_ref.extract(member, extract_dir), files))
+
 def _render_report_summary():
     """Render a summary of the uploaded report."""
     st.subheader("Report Summary")
@@ -180,34 +272,93 @@ def _render_report_summary():
     else:
         _render_tmdl_summary(metadata)
 
+def _summary_key(metadata) -> str:
+    """Get the cache key for the loaded metadata's summary.
+    
+    Uses the hash stored at upload time, so reruns don't reserialize the metadata.
+    """
+    key = st.session_state.get("metadata_hash")
+    if key is None:
+        key = st.session_state.metadata_hash = metadata_hash(metadata)
+    return key
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _pbix_summary_markdown(metadata_key: str, _metadata) -> Dict[str, str]:
+    """Build the PBIX summary lists once per metadata version.
+    
+    Args:
+        metadata_key: Metadata hash the cache is keyed on
+        _metadata: PBIX metadata (not hashed by Streamlit)
+        
+    Returns:
+        Markdown list per summary section
+    """
+    return {
+        "tables": "\n".join(f"- **{table.get('name', 'Unnamed')}** "
+                            f"({len(table.get('columns', []))} columns, "
+                            f"{len(table.get('measures', []))} measures)"
+                            for table in _metadata.get('tables', [])),
+        "relationships": "\n".join(f"- {rel.get('fromTable', '')}.[{rel.get('fromColumn', '')}] → "
+                                   f"{rel.get('toTable', '')}.[{rel.get('toColumn', '')}]"
+                                   for rel in _metadata.get('relationships', [])),
+        "visualizations": "\n".join(f"- Viz {idx+1}: {viz.get('type', 'Unknown')}"
+                                    for idx, viz in enumerate(_metadata.get('visualizations', [])))
+    }
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _tmdl_summary_markdown(metadata_key: str, _metadata) -> Dict[str, Any]:
+    """Build the TMDL summary lists once per metadata version.
+    
+    Args:
+        metadata_key: Metadata hash the cache is keyed on
+        _metadata: TMDL schema (not hashed by Streamlit)
+        
+    Returns:
+        Markdown list per summary section, with one block per table for measures
+    """
+    # Group measure names by table
+    measures_by_table = defaultdict(list)
+    for measure in _metadata.get('measures', []):
+        measures_by_table[measure.get('table', 'Unknown')].append(measure.get('name', ''))
+    
+    relationship_lines = []
+    for rel in _metadata.get('relationships', []):
+        cardinality = f" ({rel.get('toCardinality', '')})" if 'toCardinality' in rel else ""
+        relationship_lines.append(f"- {rel.get('fromTable', '')}.[{rel.get('fromColumn', '')}] → "
+                                  f"{rel.get('toTable', '')}.[{rel.get('toColumn', '')}]{cardinality}")
+    
+    return {
+        "tables": "\n".join(f"- **{table.get('name', 'Unnamed')}** "
+                            f"({len(table.get('columns', []))} columns)"
+                            for table in _metadata.get('tables', [])),
+        "measures": [f"**{table_name}**\n\n" + "\n".join(f"- {name}" for name in measure_names)
+                     for table_name, measure_names in measures_by_table.items()],
+        "relationships": "\n".join(relationship_lines)
+    }
+
 def _render_pbix_summary(metadata):
     """Render summary for PBIX file."""
     # Display summary
     tables = metadata.get('tables', [])
     relationships = metadata.get('relationships', [])
     visualizations = metadata.get('visualizations', [])
+    summary = _pbix_summary_markdown(_summary_key(metadata), metadata)
     
     # Display counts
     st.markdown(f"**Tables:** {len(tables)}")
     if len(tables) > 0:
         with st.expander("Show Tables"):
-            for table in tables:
-                st.markdown(f"- **{table.get('name', 'Unnamed')}** "
-                            f"({len(table.get('columns', []))} columns, "
-                            f"{len(table.get('measures', []))} measures)")
+            st.markdown(summary["tables"])
     
     st.markdown(f"**Relationships:** {len(relationships)}")
     if len(relationships) > 0:
         with st.expander("Show Relationships"):
-            for rel in relationships:
-                st.markdown(f"- {rel.get('fromTable', '')}.[{rel.get('fromColumn', '')}] → "
-                            f"{rel.get('toTable', '')}.[{rel.get('toColumn', '')}]")
+            st.markdown(summary["relationships"])
     
     st.markdown(f"**Visualizations:** {len(visualizations)}")
     if len(visualizations) > 0:
         with st.expander("Show Visualizations"):
-            for idx, viz in enumerate(visualizations):
-                st.markdown(f"- Viz {idx+1}: {viz.get('type', 'Unknown')}")
+            st.markdown(summary["visualizations"])
 
 def _render_tmdl_summary(metadata):
     """Render summary for TMDL files."""
@@ -215,39 +366,25 @@ def _render_tmdl_summary(metadata):
     tables = metadata.get('tables', [])
     relationships = metadata.get('relationships', [])
     measures = metadata.get('measures', [])
+    summary = _tmdl_summary_markdown(_summary_key(metadata), metadata)
     
     # Display counts
     st.markdown(f"**Tables:** {len(tables)}")
     if len(tables) > 0:
         with st.expander("Show Tables"):
-            for table in tables:
-                st.markdown(f"- **{table.get('name', 'Unnamed')}** "
-                            f"({len(table.get('columns', []))} columns)")
+            st.markdown(summary["tables"])
     
     st.markdown(f"**Measures:** {len(measures)}")
     if len(measures) > 0:
         with st.expander("Show Measures"):
-            # Group measures by table
-            measures_by_table = {}
-            for measure in measures:
-                table_name = measure.get('table', 'Unknown')
-                if table_name not in measures_by_table:
-                    measures_by_table[table_name] = []
-                measures_by_table[table_name].append(measure)
-            
-            # Display measures by table
-            for table_name, table_measures in measures_by_table.items():
-                st.markdown(f"**{table_name}**")
-                for measure in table_measures:
-                    st.markdown(f"- {measure.get('name', '')}")
+            # Display measures by table, one element per table
+            for table_block in summary["measures"]:
+                st.markdown(table_block)
     
     st.markdown(f"**Relationships:** {len(relationships)}")
     if len(relationships) > 0:
         with st.expander("Show Relationships"):
-            for rel in relationships:
-                cardinality = f" ({rel.get('toCardinality', '')})" if 'toCardinality' in rel else ""
-                st.markdown(f"- {rel.get('fromTable', '')}.[{rel.get('fromColumn', '')}] → "
-                            f"{rel.get('toTable', '')}.[{rel.get('toColumn', '')}]{cardinality}")
+            st.markdown(summary["relationships"])
 
 def _render_example_prompts():
     """Render example prompt buttons."""
@@ -255,20 +392,13 @@ def _render_example_prompts():
     
     for example in config.EXAMPLE_PROMPTS:
         if st.button(example):
-            # Add user message to memory
-            memory.add_message("user", example)
-            
-            # Get response from Claude
-            with st.spinner("Thinking..."):
-                response = query_claude(example, st.session_state.model_context)
-            
-            # Note: The assistant message is added to memory in query_claude
-            st.rerun()
+            # Hand the prompt to the main page, which renders after the sidebar in
+            # this same run and streams the response like a typed question
+            st.session_state.pending_prompt = example
 
 # Add this at the bottom of sidebar.py
 def render_chat_controls():
     """Render chat controls in the sidebar."""
     if st.session_state.file_uploaded:
         if st.button("🗑️ Clear Chat"):
-            memory.clear_history()
-            st.rerun()
\ No newline at end of file
+            memory.clear_history()
\ No newline at end of file
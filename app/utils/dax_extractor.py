@@ -6,7 +6,38 @@ and extract relevant templates.
 
 from typing import List, Dict, Any
 import re
-from app.prompts.dax_templates import DAX_PATTERNS, TIME_INTELLIGENCE_PATTERNS, STATISTICAL_PATTERNS
+from app.prompts.dax_templates import ALL_PATTERNS
+
+# Query terms for each pattern, in the order patterns are suggested, with the
+# pattern added alongside when the query also asks for a percentage
+_PATTERN_RULES = [
+    # Time intelligence patterns
+    (("ytd", "year to date", "this year", "year-to-date"), "year_to_date", None),
+    (("mtd", "month to date", "this month", "month-to-date"), "month_to_date", None),
+    (("qtd", "quarter to date", "this quarter", "quarter-to-date"), "quarter_to_date", None),
+    (("yoy", "year over year", "previous year", "last year", "year-over-year"), "year_over_year", "year_over_year_percent"),
+    (("previous month", "last month"), "previous_month", None),
+    (("previous quarter", "last quarter"), "previous_quarter", None),
+    # Statistical patterns
+    (("percent of total", "percentage of total", "% of total"), "percentage_of_total", None),
+    (("variance", "difference", "gap"), "variance", "variance_percent"),
+    # Other common patterns
+    (("running total", "cumulative", "running sum"), "running_total", None),
+    (("moving average", "rolling average"), "moving_average", None),
+    (("top", "ranking", "rank"), "top_n", None),
+]
+_PERCENT_TERMS = ("percent", "%")
+
+# Terms marking a measure question, and the common patterns suggested when nothing specific matched
+_MEASURE_TERMS = ("measure", "dax", "calculate")
+_FALLBACK_PATTERNS = ("year_over_year", "month_to_date", "percentage_of_total")
+
+_ALL_TERMS = {term for terms, _, _ in _PATTERN_RULES for term in terms} | set(_PERCENT_TERMS) | set(_MEASURE_TERMS)
+
+# One scan finds every term: the lookahead tries each position, and the longest
+# alternative wins there, so shorter terms it contains are added via _CONTAINED_TERMS
+_TERM_RE = re.compile("(?=(%s))" % "|".join(re.escape(term) for term in sorted(_ALL_TERMS, key=len, reverse=True)))
+_CONTAINED_TERMS = {term: frozenset(other for other in _ALL_TERMS if other in term) for term in _ALL_TERMS}
 
 def identify_dax_pattern_from_query(query: str) -> List[Dict[str, Any]]:
     """Identify relevant DAX patterns based on user query.
@@ -17,55 +48,22 @@ def identify_dax_pattern_from_query(query: str) -> List[Dict[str, Any]]:
     Returns:
         List of relevant pattern dictionaries with description and template
     """
-    query = query.lower()
-    relevant_patterns = []
-    
-    # Check for time intelligence patterns
-    if any(term in query for term in ["ytd", "year to date", "this year", "year-to-date"]):
-        relevant_patterns.append(TIME_INTELLIGENCE_PATTERNS["year_to_date"])
-    
-    if any(term in query for term in ["mtd", "month to date", "this month", "month-to-date"]):
-        relevant_patterns.append(TIME_INTELLIGENCE_PATTERNS["month_to_date"])
-    
-    if any(term in query for term in ["qtd", "quarter to date", "this quarter", "quarter-to-date"]):
-        relevant_patterns.append(TIME_INTELLIGENCE_PATTERNS["quarter_to_date"])
+    found = set()
+    for match in _TERM_RE.finditer(query.lower()):
+        found |= _CONTAINED_TERMS[match.group(1)]
     
-    if any(term in query for term in ["yoy", "year over year", "previous year", "last year", "year-over-year"]):
-        relevant_patterns.append(DAX_PATTERNS["year_over_year"])
-        if "percent" in query or "%" in query:
-            relevant_patterns.append(DAX_PATTERNS["year_over_year_percent"])
-    
-    if any(term in query for term in ["previous month", "last month"]):
-        relevant_patterns.append(TIME_INTELLIGENCE_PATTERNS["previous_month"])
-    
-    if any(term in query for term in ["previous quarter", "last quarter"]):
-        relevant_patterns.append(TIME_INTELLIGENCE_PATTERNS["previous_quarter"])
-    
-    # Check for statistical patterns
-    if any(term in query for term in ["percent of total", "percentage of total", "% of total"]):
-        relevant_patterns.append(STATISTICAL_PATTERNS["percentage_of_total"])
-    
-    if any(term in query for term in ["variance", "difference", "gap"]):
-        relevant_patterns.append(STATISTICAL_PATTERNS["variance"])
-        if "percent" in query or "%" in query:
-            relevant_patterns.append(STATISTICAL_PATTERNS["variance_percent"])
-    
-    # Check for other common patterns
-    if any(term in query for term in ["running total", "cumulative", "running sum"]):
-        relevant_patterns.append(DAX_PATTERNS["running_total"])
-    
-    if any(term in query for term in ["moving average", "rolling average"]):
-        relevant_patterns.append(DAX_PATTERNS["moving_average"])
+    wants_percent = not found.isdisjoint(_PERCENT_TERMS)
+    relevant_patterns = []
     
-    if any(term in query for term in ["top", "ranking", "rank"]):
-        relevant_patterns.append(DAX_PATTERNS["top_n"])
+    for terms, pattern_key, percent_key in _PATTERN_RULES:
+        if not found.isdisjoint(terms):
+            relevant_patterns.append(ALL_PATTERNS[pattern_key])
+            if percent_key and wants_percent:
+                relevant_patterns.append(ALL_PATTERNS[percent_key])
     
     # If nothing specific was found but it's a measure question, provide some common patterns
-    if not relevant_patterns and any(term in query for term in ["measure", "dax", "calculate"]):
-        # Provide the most commonly used patterns as fallback
-        relevant_patterns.append(DAX_PATTERNS["year_over_year"])
-        relevant_patterns.append(TIME_INTELLIGENCE_PATTERNS["month_to_date"])
-        relevant_patterns.append(STATISTICAL_PATTERNS["percentage_of_total"])
+    if not relevant_patterns and not found.isdisjoint(_MEASURE_TERMS):
+        relevant_patterns = [ALL_PATTERNS[pattern_key] for pattern_key in _FALLBACK_PATTERNS]
     
     return relevant_patterns
 
@@ -81,10 +79,10 @@ def format_dax_patterns_for_context(patterns: List[Dict[str, Any]]) -> str:
     if not patterns:
         return ""
     
-    result = "\n## RELEVANT DAX PATTERNS\n"
+    parts = ["\n## RELEVANT DAX PATTERNS\n"]
     
     for pattern in patterns:
-        result += f"\n**{pattern['description']}:**\n"
-        result += f"```dax\n{pattern['template']}\n```\n"
+        parts.append(f"\n**{pattern['description']}:**\n")
+        parts.append(f"```dax\n{pattern['template']}\n```\n")
     
-    return result
\ No newline at end of file
+    return "".join(parts)
\ No newline at end of file
@@ -1,36 +1,64 @@
 # app/utils/extractors.py
 import re
-from typing import List, Dict, Any
+import copy
+import functools
+from typing import List, Dict, Any, Optional, Tuple
+from app.utils.formatters import format_dax
+
+# Patterns used by the extractors, compiled once at import
+_INLINE_MEASURE_RE = re.compile(r"([A-Za-z][A-Za-z0-9\s]*)\s*=\s*([^;]+);")
+_VIZ_TYPE_RE = re.compile(r"recommend(?:ed)?\s+(?:using|a|an)\s+([A-Za-z\s]+chart|[A-Za-z\s]+graph|[A-Za-z\s]+map|[A-Za-z\s]+visual|[A-Za-z\s]+table)", re.IGNORECASE)
+_VIZ_FIELD_RE = re.compile(r"(axis|value|category|series|legend|tooltip|size|filter|slicer|drillthrough)(?:\s+should\s+be|\s*:)?\s+([^\n,.]+)", re.IGNORECASE)
+_FIELD_FILLER_RE = re.compile(r"^(?:the|use|using|set\s+to|add|put)\s+", re.IGNORECASE)
+
+# Number of responses whose extraction results are kept
+_CACHE_SIZE = 512
 
 def extract_measures(text: str) -> List[Dict[str, str]]:
     """Extract measures from Claude's response.
     
+    Results are cached per response text, since the same assistant messages
+    are processed again on every Streamlit rerun.
+    
     Args:
         text: Text to extract measures from
         
     Returns:
         List of dictionaries with name and expression keys
     """
+    # Every measure definition has an '=', so plain chat answers skip the parsing
+    if "=" not in text:
+        return []
+    
+    # Hand out a copy so callers can't modify the cached result
+    return copy.deepcopy(_extract_measures(text))
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _extract_measures(text: str) -> List[Dict[str, str]]:
+    """Uncopied, cached implementation of extract_measures."""
     measures = []
+    seen = set()
     
-    # Look for code blocks with DAX
-    code_blocks = re.finditer(r"```(?:dax)?\s*([^`]+)```", text, re.DOTALL)
+    # Look for code blocks with DAX, reusing format_dax's cached split
+    _, code_blocks = format_dax(text)
     
-    for match in code_blocks:
-        code = match.group(1).strip()
+    for code in code_blocks:
+        code = code.strip()
         extracted = _parse_dax_code(code)
         if extracted:
             measures.extend(extracted)
+            seen.update(m['name'] for m in extracted)
     
-    # Also look for inline measure definitions (not in code blocks)
-    inline_measures = re.finditer(r"([A-Za-z][A-Za-z0-9\s]*)\s*=\s*([^;]+);", text)
+    # Also look for inline measure definitions (not in code blocks), which end with ';'
+    inline_measures = _INLINE_MEASURE_RE.finditer(text) if ";" in text else ()
     
     for match in inline_measures:
         name = match.group(1).strip()
         expression = match.group(2).strip()
         
         # Only add if we don't already have this measure
-        if not any(m['name'] == name for m in measures):
+        if name not in seen:
+            seen.add(name)
             measures.append({
                 "name": name,
                 "expression": expression
@@ -60,9 +88,9 @@ def _parse_dax_code(code: str) -> List[Dict[str, str]]:
             continue
             
         # Look for measure definition (name = expression)
-        match = re.match(r"([A-Za-z][A-Za-z0-9\s]*)\s*=\s*(.+)$", line)
+        definition = _split_measure_definition(line)
         
-        if match:
+        if definition:
             # If we were already defining a measure, save it
             if current_measure and current_expression:
                 measures.append({
@@ -71,8 +99,8 @@ def _parse_dax_code(code: str) -> List[Dict[str, str]]:
                 })
             
             # Start new measure
-            current_measure = match.group(1).strip()
-            current_expression = [match.group(2).strip()]
+            current_measure, expression = definition
+            current_expression = [expression]
         elif current_measure:
             # Continue existing measure
             current_expression.append(line)
@@ -86,32 +114,64 @@ def _parse_dax_code(code: str) -> List[Dict[str, str]]:
     
     return measures
 
+def _split_measure_definition(line: str) -> Optional[Tuple[str, str]]:
+    """Split a 'Name = expression' line into its name and expression.
+    
+    The name must start with an ASCII letter and contain only ASCII letters,
+    digits and whitespace; the expression must be non-empty.
+    
+    Args:
+        line: Line of a DAX code block
+        
+    Returns:
+        Stripped name and expression, or None if the line isn't a definition
+    """
+    equals = line.find('=')
+    if equals <= 0 or equals == len(line) - 1:
+        return None
+    
+    name = line[:equals]
+    if not (name[0].isascii() and name[0].isalpha()):
+        return None
+    if not all((char.isascii() and char.isalnum()) or char.isspace() for char in name):
+        return None
+    
+    return name.strip(), line[equals + 1:].strip()
+
 def extract_visualization_recommendation(text: str) -> Dict[str, Any]:
     """Extract visualization recommendation from Claude's response.
     
+    Results are cached per response text, like extract_measures.
+    
     Args:
         text: Text to extract visualization from
         
     Returns:
         Dictionary with visualization recommendation or empty dict if none found
     """
+    # Hand out a copy so callers can't modify the cached result
+    return copy.deepcopy(_extract_visualization_recommendation(text))
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _extract_visualization_recommendation(text: str) -> Dict[str, Any]:
+    """Uncopied, cached implementation of extract_visualization_recommendation."""
     viz_info = {}
     
     # Extract visualization type
-    viz_type_match = re.search(r"recommend(?:ed)?\s+(?:using|a|an)\s+([A-Za-z\s]+chart|[A-Za-z\s]+graph|[A-Za-z\s]+map|[A-Za-z\s]+visual|[A-Za-z\s]+table)", text, re.IGNORECASE)
+    viz_type_match = _VIZ_TYPE_RE.search(text)
     if viz_type_match:
         viz_info["type"] = viz_type_match.group(1).strip()
     
     # Extract fields
     fields = []
-    field_matches = re.finditer(r"(axis|value|category|series|legend|tooltip|size|filter|slicer|drillthrough)(?:\s+should\s+be|\s*:)?\s+([^\n,.]+)", text, re.IGNORECASE)
+    field_matches = _VIZ_FIELD_RE.finditer(text)
     
     for match in field_matches:
         role = match.group(1).strip().lower()
         field = match.group(2).strip()
         
         # Clean up field name (remove "the", "use", etc.)
-        field = re.sub(r"^(?:the|use|using|set\s+to|add|put)\s+", "", field, flags=re.IGNORECASE).strip()
+        field = _FIELD_FILLER_RE.sub("", field).strip()
         
         fields.append({
             "role": role,
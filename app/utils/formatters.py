@@ -1,14 +1,16 @@
 # app/utils/formatters.py
-import re
-import pygments
-from pygments.lexers import SqlLexer
-from pygments.formatters import HtmlFormatter
+import functools
+from typing import List, Tuple
 
-def format_dax(text: str) -> str:
+_FENCE = "```"
+
+@functools.lru_cache(maxsize=256)
+def format_dax(text: str) -> Tuple[str, Tuple[str, ...]]:
     """Format DAX code blocks for display.
     
     Extract DAX code blocks from markdown so they can be displayed with 
-    Streamlit's st.code() function.
+    Streamlit's st.code() function. Results are cached because every
+    Streamlit rerun re-renders the whole chat history.
     
     Args:
         text: Text containing markdown code blocks
@@ -16,16 +18,44 @@ def format_dax(text: str) -> str:
     Returns:
         Text with code blocks replaced by special markers and the extracted code blocks
     """
-    # Extract code blocks for separate rendering
-    pattern = r"```(?:dax)?\s*([^`]+)```"
+    parts: List[str] = []
+    code_blocks: List[str] = []
+    position = 0
+    search_from = 0
     
-    # Find all code blocks
-    code_blocks = re.findall(pattern, text, flags=re.DOTALL)
+    # A code block is a fence, a body without backticks, and a closing fence;
+    # scanning with str.find keeps this linear with no regex backtracking
+    while True:
+        start = text.find(_FENCE, search_from)
+        if start == -1:
+            break
+        
+        body_start = start + len(_FENCE)
+        end = text.find("`", body_start)
+        if end == -1:
+            break
+        
+        if end == body_start or not text.startswith(_FENCE, end):
+            # Not a block from this fence; it may still start one backtick later
+            search_from = start + 1
+            continue
+        
+        parts.append(text[position:start])
+        parts.append("[[CODE_BLOCK]]")
+        code_blocks.append(_code_block_body(text[body_start:end]))
+        position = search_from = end + len(_FENCE)
     
-    # Replace code blocks with placeholders
-    cleaned_text = re.sub(pattern, "[[CODE_BLOCK]]", text, flags=re.DOTALL)
+    parts.append(text[position:])
+    return "".join(parts), tuple(code_blocks)
+
+def _code_block_body(body: str) -> str:
+    """Drop an optional dax tag and leading whitespace from a code block body.
     
-    return cleaned_text, code_blocks
+    Always leaves at least one character, as the regex this scanner replaced did.
+    """
+    if body.startswith("dax") and len(body) > 3:
+        body = body[3:]
+    return body.lstrip() or body[-1]
 
 def format_table_columns(table_data: dict) -> str:
     """Format table columns information for display.
@@ -36,15 +66,16 @@ def format_table_columns(table_data: dict) -> str:
     Returns:
         Formatted HTML string
     """
-    html = f"<h4>{table_data['name']}</h4>"
-    html += "<table>"
-    html += "<tr><th>Column</th><th>Data Type</th></tr>"
-    
-    for column in table_data.get('columns', []):
-        html += f"<tr><td>{column.get('name', '')}</td><td>{column.get('dataType', '')}</td></tr>"
+    rows = "".join(
+        f"<tr><td>{column.get('name', '')}</td><td>{column.get('dataType', '')}</td></tr>"
+        for column in table_data.get('columns', [])
+    )
     
-    html += "</table>"
-    return html
+    return (f"<h4>{table_data['name']}</h4>"
+            "<table>"
+            "<tr><th>Column</th><th>Data Type</th></tr>"
+            f"{rows}"
+            "</table>")
 
 def format_measure(measure_data: dict) -> str:
     """Format measure information for display.
@@ -58,12 +89,10 @@ def format_measure(measure_data: dict) -> str:
     name = measure_data.get('name', '')
     expression = measure_data.get('expression', '')
     
-    html = f"<div class='measure-block'>"
-    html += f"<div class='measure-name'>{name}</div>"
-    html += f"<div class='measure-expression code-block'>{expression}</div>"
-    html += "</div>"
-    
-    return html
+    return ("<div class='measure-block'>"
+            f"<div class='measure-name'>{name}</div>"
+            f"<div class='measure-expression code-block'>{expression}</div>"
+            "</div>")
 
 def format_visualization_spec(viz_spec: dict) -> str:
     """Format visualization specification for display.
@@ -77,19 +106,19 @@ def format_visualization_spec(viz_spec: dict) -> str:
     viz_type = viz_spec.get('type', 'Unknown')
     title = viz_spec.get('title', viz_type)
     
-    html = f"<div class='viz-spec'>"
-    html += f"<div class='viz-title'>{title}</div>"
-    html += f"<div class='viz-type'>Type: {viz_type}</div>"
+    parts = [
+        "<div class='viz-spec'>",
+        f"<div class='viz-title'>{title}</div>",
+        f"<div class='viz-type'>Type: {viz_type}</div>",
+    ]
     
     if 'fields' in viz_spec:
-        html += "<div class='viz-fields'>"
-        html += "<h5>Fields</h5>"
-        html += "<ul>"
-        for field in viz_spec['fields']:
-            html += f"<li><b>{field.get('role', '')}:</b> {field.get('field', '')}</li>"
-        html += "</ul>"
-        html += "</div>"
+        parts.append("<div class='viz-fields'>")
+        parts.append("<h5>Fields</h5>")
+        parts.append("<ul>")
+        parts.extend(f"<li><b>{field.get('role', '')}:</b> {field.get('field', '')}</li>" for field in viz_spec['fields'])
+        parts.append("</ul>")
+        parts.append("</div>")
     
-    html += "</div>"
-    return html
-
+    parts.append("</div>")
+    return "".join(parts)
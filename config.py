@@ -1,5 +1,6 @@
 # config.py
 import os
+import re
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -9,13 +10,59 @@ load_dotenv()
 APP_TITLE = "Power BI NL Assistant"
 APP_ICON = "📊"
 
+# Keyword arguments for st.set_page_config; main.py is re-executed on every
+# rerun, so they are built here, once per process
+PAGE_CONFIG = {
+    "page_title": APP_TITLE,
+    "page_icon": APP_ICON,
+    "layout": "wide",
+    "initial_sidebar_state": "expanded"
+}
+
 # API settings
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-6")
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "2000"))
+MAX_CONCURRENT_CLAUDE_CALLS = int(os.getenv("MAX_CONCURRENT_CLAUDE_CALLS", "4"))
+CLAUDE_MAX_RETRIES = int(os.getenv("CLAUDE_MAX_RETRIES", "3"))
+CLAUDE_RETRY_INITIAL_WAIT = float(os.getenv("CLAUDE_RETRY_INITIAL_WAIT", "0.5"))
+CLAUDE_RETRY_MAX_WAIT = float(os.getenv("CLAUDE_RETRY_MAX_WAIT", "8"))
 
 # Conversation settings
 MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "10"))
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.05"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "4000"))
+MEMORY_RECENT_MESSAGES = int(os.getenv("MEMORY_RECENT_MESSAGES", "4"))
+MEMORY_SUMMARY_MODEL = os.getenv("MEMORY_SUMMARY_MODEL", "claude-haiku-4-5")
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "500"))
+
+# Response cache settings
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+
+# Schema context budget
+MAX_TABLES_IN_CONTEXT = int(os.getenv("MAX_TABLES_IN_CONTEXT", "30"))
+MAX_COLUMNS_PER_TABLE = int(os.getenv("MAX_COLUMNS_PER_TABLE", "25"))
+MAX_MEASURE_EXPRESSION_CHARS = int(os.getenv("MAX_MEASURE_EXPRESSION_CHARS", "500"))
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_WHITESPACE_RE = re.compile(r"\s+")
+_CSS_PUNCTUATION_RE = re.compile(r"\s*([{};,>])\s*")
+
+def _minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from a stylesheet.
+    
+    Args:
+        css: Stylesheet source, including its <style> tags
+        
+    Returns:
+        Equivalent stylesheet without comments or formatting whitespace
+    """
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _CSS_WHITESPACE_RE.sub(" ", css)
+    css = _CSS_PUNCTUATION_RE.sub(r"\1", css)
+    return css.replace(": ", ":").replace(";}", "}").strip()
 
 # Custom CSS for styling the app
 # In config.py
@@ -55,10 +102,6 @@ CSS = """
         background-color: var(--secondary-bg) !important;
     }
 
-    .st-emotion-cache-1wbqy5l, .st-emotion-cache-1l16s73 {
-        color: var(--text-primary) !important;
-    }
-
     /* Rest of your existing CSS */
     .css-1544g2n {
         padding: 2rem 1rem;
@@ -152,12 +195,7 @@ CSS = """
     }
 
     /* File uploader styling */
-    .stFileUploader > div > label {
-        background-color: var(--teal-dark) !important;
-        color: white !important;
-    }
-
-    .stFileUploader > div > button {
+    .stFileUploader > div > label, .stFileUploader > div > button {
         background-color: var(--teal-dark) !important;
         color: white !important;
     }
@@ -218,7 +256,7 @@ CSS = """
     }
     
     /* More specific selectors for various Streamlit elements */
-    .st-emotion-cache-1gulkj5, .st-emotion-cache-1l16s73 {
+    .st-emotion-cache-1wbqy5l, .st-emotion-cache-1gulkj5, .st-emotion-cache-1l16s73 {
         color: var(--text-primary) !important;
     }
     
@@ -243,6 +281,9 @@ CSS = """
 </style>
 """
 
+# The stylesheet is sent to the browser on every rerun, so ship it minified
+CSS = _minify_css(CSS)
+
 EXAMPLE_PROMPTS = [
     "How can I visualise TPR by sub_brand and region as a timeseries?",
     "Create a measure for sales YoY growth",
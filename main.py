@@ -1,28 +1,29 @@
 # main.py
 import streamlit as st
-from app.ui.main_page import render_main_ui
-from app.ui.sidebar import render_sidebar
 import config
 
+# Session state defaults (immutable, so they can be shared across sessions)
+_SESSION_DEFAULTS = (
+    ("metadata", None),
+    ("file_uploaded", False),
+    ("model_context", ""),
+)
+
 def main():
     # Page configuration
-    st.set_page_config(
-        page_title=config.APP_TITLE,
-        page_icon=config.APP_ICON,
-        layout="wide",
-        initial_sidebar_state="expanded"
-    )
+    st.set_page_config(**config.PAGE_CONFIG)
+    
+    # Apply custom CSS; st.html inserts it as-is, without the markdown parser
+    st.html(config.CSS)
     
-    # Apply custom CSS
-    st.markdown(config.CSS, unsafe_allow_html=True)
+    # Imported here so the page config and CSS reach the browser before the
+    # services (HTTP client, parsers, memory) are loaded on a cold start
+    from app.ui.sidebar import render_sidebar
+    from app.ui.main_page import render_main_ui
     
     # Initialize session state
-    if "metadata" not in st.session_state:
-        st.session_state.metadata = None
-    if "file_uploaded" not in st.session_state:
-        st.session_state.file_uploaded = False
-    if "model_context" not in st.session_state:
-        st.session_state.model_context = ""
+    for key, value in _SESSION_DEFAULTS:
+        st.session_state.setdefault(key, value)
     
     # Render sidebar
     render_sidebar()
@@ -0,0 +1,194 @@
+# tests/test_llm_service.py
+import httpx
+import pytest
+
+import config
+from app.services import llm_service
+from app.services.response_cache import ResponseCache, SemanticCache
+
+
+class FakeMemory:
+    """Stand-in for the chat memory's messages and context store."""
+
+    def __init__(self):
+        self.messages = []
+        self.context = {}
+
+    def add_message(self, role, content, rendered=None):
+        self.messages.append({"role": role, "content": content})
+
+    def format_history_for_anthropic(self):
+        return list(self.messages)
+
+    def get_context(self, key, default=None):
+        return self.context.get(key, default)
+
+    def set_context(self, key, value):
+        self.context[key] = value
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Client that answers each request with the next queued outcome."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.sent = 0
+
+    def build_request(self, method, url, content=None):
+        return content
+
+    def send(self, request, stream=False):
+        self.sent += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """Route summarization to a counter instead of the API."""
+    calls = []
+
+    def summarize(messages, previous_summary=None):
+        calls.append(messages)
+        return f"summary {len(calls)}"
+
+    monkeypatch.setattr(llm_service, "memory", FakeMemory())
+    monkeypatch.setattr(llm_service, "_summarize_messages", summarize)
+    monkeypatch.setattr(config, "MEMORY_TOKEN_BUDGET", 150)
+    monkeypatch.setattr(config, "MEMORY_RECENT_MESSAGES", 4)
+    return calls
+
+
+def _converse(prompts):
+    """Compact the history before each prompt, as _start_turn does."""
+    history, sent = [], []
+    for prompt in prompts:
+        history.append({"role": "user", "content": prompt + " " + "x" * 300})
+        sent.append(llm_service._compact_history(history[-10:]))
+        history.append({"role": "assistant", "content": "answer " + "y" * 300})
+    return history, sent
+
+
+def test_history_under_budget_is_sent_verbatim(summaries):
+    messages = [{"role": "user", "content": "show total sales"}]
+    assert llm_service._compact_history(messages) == messages
+    assert not summaries
+
+
+def test_compacted_history_ends_with_current_prompt(summaries):
+    history, sent = _converse(["q1", "q2", "q3", "q4", "q5"])
+    assert summaries
+    for messages in sent:
+        assert messages[-1]["role"] == "user"
+    assert sent[-1][-1] == history[-2]
+
+
+def test_repeated_prompt_is_still_sent(summaries):
+    prompts = ["show total sales by region", "explain ytd", "q3", "q4", "show total sales by region"]
+    history, sent = _converse(prompts)
+    assert sent[-1][0]["content"].startswith("Previous conversation summary:")
+    assert sent[-1][-1] == history[-2]
+    assert len(sent[-1]) > 1
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry waits instead of sleeping."""
+    waits = []
+    monkeypatch.setattr(llm_service.time, "sleep", waits.append)
+    monkeypatch.setattr(llm_service, "_rate_limited_until", 0.0)
+    monkeypatch.setattr(config, "CLAUDE_MAX_RETRIES", 2)
+    return waits
+
+
+def _send(monkeypatch, outcomes):
+    client = FakeClient(outcomes)
+    monkeypatch.setattr(llm_service, "_CLIENT", client)
+    with llm_service._send_request(b"{}") as response:
+        return client, response
+
+
+def test_overloaded_request_is_retried(monkeypatch, sleeps):
+    overloaded, ok = FakeResponse(529), FakeResponse(200)
+    client, response = _send(monkeypatch, [overloaded, ok])
+    assert response is ok
+    assert client.sent == 2
+    assert overloaded.closed
+    assert len(sleeps) == 1
+
+
+def test_retry_after_header_sets_the_wait(monkeypatch, sleeps):
+    _send(monkeypatch, [FakeResponse(429, {"retry-after": "2"}), FakeResponse(200)])
+    assert sleeps[0] == 2.0
+    assert llm_service._rate_limited_until > 0
+
+
+def test_last_attempt_response_is_returned(monkeypatch, sleeps):
+    client, response = _send(monkeypatch, [FakeResponse(503), FakeResponse(503), FakeResponse(503)])
+    assert response.status_code == 503
+    assert client.sent == 3
+
+
+def test_timeout_on_last_attempt_is_raised(monkeypatch, sleeps):
+    timeouts = [httpx.TimeoutException("timed out") for _ in range(3)]
+    with pytest.raises(httpx.TimeoutException):
+        _send(monkeypatch, timeouts)
+
+
+def test_client_error_is_not_retried(monkeypatch, sleeps):
+    client, response = _send(monkeypatch, [FakeResponse(400)])
+    assert response.status_code == 400
+    assert client.sent == 1
+    assert not sleeps
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    """Run turns against fresh caches and memory."""
+    memory = FakeMemory()
+    monkeypatch.setattr(llm_service, "memory", memory)
+    monkeypatch.setattr(llm_service, "response_cache", ResponseCache(maxsize=8, ttl=60))
+    monkeypatch.setattr(llm_service, "semantic_cache", SemanticCache(maxsize=8, ttl=60))
+    return memory
+
+
+def test_repeated_turn_is_served_from_cache(turns):
+    turn = llm_service._start_turn("show total sales", "ctx")
+    assert turn["cached_response"] is None
+    assert turn["data"]["messages"][-1] == {"role": "user", "content": "show total sales"}
+    llm_service._finish_turn(turn, "Total Sales = SUM(Sales[Amount])")
+
+    turns.messages.clear()
+    turn = llm_service._start_turn("Show total sales?", "ctx")
+    assert turn["cached_response"] == "Total Sales = SUM(Sales[Amount])"
+    assert "data" not in turn
+    assert turns.messages[-1] == {"role": "user", "content": "Show total sales?"}
+
+
+def test_cache_lookup_depends_on_context_and_history(turns):
+    turn = llm_service._start_turn("show total sales", "ctx")
+    llm_service._finish_turn(turn, "answer")
+
+    assert llm_service._start_turn("show total sales", "other ctx")["cached_response"] is None
+    assert llm_service._start_turn("show total sales", "ctx")["cached_response"] is None
+
+
+def test_measure_paraphrase_is_served_from_semantic_cache(turns):
+    turn = llm_service._start_turn("Create a measure for year to date sales", "ctx")
+    llm_service._finish_turn(turn, "YTD Sales = TOTALYTD(...)")
+
+    turns.messages.clear()
+    turn = llm_service._start_turn("Write a YTD sales measure", "ctx")
+    assert turn["cached_response"] == "YTD Sales = TOTALYTD(...)"
\ No newline at end of file
@@ -0,0 +1,66 @@
+# tests/test_response_cache.py
+import pytest
+
+from app.services.response_cache import ResponseCache, SemanticCache, normalize_prompt
+
+
+def test_normalize_prompt_ignores_case_whitespace_and_punctuation():
+    assert normalize_prompt("  Total   Sales by Region? ") == "total sales by region"
+
+
+@pytest.mark.parametrize("first, second", [
+    ("amount > 1000", "amount < 1000"),
+    ("amount >= 1000", "amount != 1000"),
+    ("profit / sales", "profit * sales"),
+    ("sales + returns", "sales - returns"),
+    ("(a + b) * c", "a + b * c"),
+])
+def test_response_cache_keys_keep_operators(first, second):
+    cache = ResponseCache()
+    assert cache.make_key(first, "ctx", "model") != cache.make_key(second, "ctx", "model")
+
+
+def _cached(prompt, response="cached"):
+    cache = SemanticCache(maxsize=8, ttl=60)
+    cache.set(prompt, "ctx", "model", [], response)
+    return cache
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Create a measure for year to date sales", "Write a YTD sales measure"),
+    ("ytd sales", "sales ytd"),
+    ("Calculate the running total of revenue", "revenue running sum"),
+    ("Calculate the running total of revenue", "running sum of revenue please"),
+    ("sales excluding returns by region", "sales by region excluding returns"),
+])
+def test_semantic_cache_matches_paraphrases(first, second):
+    assert _cached(first).get(second, "ctx", "model", []) == "cached"
+    assert _cached(second).get(first, "ctx", "model", []) == "cached"
+
+
+@pytest.mark.parametrize("first, second", [
+    ("divide profit by sales", "divide sales by profit"),
+    ("total sales and margin per region and product for the last 12 months", "total sales and margin per region and product for the last 6 months"),
+    ("total sales in 2023 by region", "total sales not in 2023 by region"),
+    ("average order value per customer segment for the last 12 months", "median order value per customer segment for the last 12 months"),
+    ("total sales and margin per region and product for the last 12 months", "total sales and margin per region and customer for the last 12 months"),
+    ("total sales by month and year", "total sales by week and year"),
+    ("sales for product A", "sales for product"),
+    ("ytd sales", "ytd sales measure"),
+])
+def test_semantic_cache_rejects_near_misses(first, second):
+    assert _cached(first).get(second, "ctx", "model", []) is None
+    assert _cached(second).get(first, "ctx", "model", []) is None
+
+
+def test_semantic_cache_is_scoped_to_context():
+    cache = _cached("ytd sales")
+    assert cache.get("ytd sales", "other ctx", "model", []) is None
+
+
+def test_semantic_cache_invalidates_by_context():
+    cache = _cached("ytd sales")
+    cache.set("ytd sales", "other ctx", "model", [], "other")
+    cache.invalidate("ctx")
+    assert cache.get("ytd sales", "ctx", "model", []) is None
+    assert cache.get("ytd sales", "other ctx", "model", []) == "other"
\ No newline at end of file
@@ -0,0 +1,19 @@
+# tests/test_schema_manager.py
+import config
+from app.services.schema_manager import SchemaManager
+
+
+def test_context_skips_measures_of_omitted_tables(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "MAX_TABLES_IN_CONTEXT", 1)
+    schema = {
+        "tables": [{"name": "Sales"}, {"name": "Notes"}],
+        "relationships": [{"fromTable": "Sales", "fromColumn": "DateKey", "toTable": "Date", "toColumn": "DateKey"}],
+        "measures": [
+            {"name": "Total Sales", "table": "Sales", "expression": "SUM(Sales[Amount])"},
+            {"name": "Note Count", "table": "Notes", "expression": "COUNTROWS(Notes)"},
+        ],
+    }
+    context = SchemaManager(str(tmp_path)).prepare_context(schema)
+    assert "Total Sales" in context
+    assert "Note Count" not in context
+    assert "+1 more measures in omitted tables" in context
\ No newline at end of file